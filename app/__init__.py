@@ -6,7 +6,14 @@ Aplikasi untuk menilai laporan praktikum mahasiswa secara otomatis menggunakan L
 """
 
 import os
+
+# Let the CUDA caching allocator grow segments instead of fragmenting across long batches.
+# PyTorch reads this when CUDA is first initialized (log_gpu_status below already does so),
+# so it is set before anything can import torch; an explicit value from the environment wins.
+os.environ.setdefault('PYTORCH_CUDA_ALLOC_CONF', 'expandable_segments:True,max_split_size_mb:128')
+
 import time
+import threading
 import logging
 from logging.handlers import RotatingFileHandler
 from flask import Flask
@@ -17,16 +24,22 @@ from sqlalchemy.exc import SQLAlchemyError
 
 from app.config import Config
 from app.extensions import db, login_manager, csrf, scheduler
+from app.json_provider import OrjsonJSONProvider, orjson
+from app.upload_request import UploadRequest
 from app.services.runtime_settings_service import sync_runtime_settings
 
 
 def create_app(config_class=Config, test_config=None):
     """Application factory pattern."""
     app = Flask(__name__)
+    app.request_class = UploadRequest
     app.config.from_object(config_class)
     
     if test_config:
         app.config.from_mapping(test_config)
+
+    if orjson is not None:
+        app.json = OrjsonJSONProvider(app)
     
     # Initialize extensions
     db.init_app(app)
@@ -43,10 +56,11 @@ def create_app(config_class=Config, test_config=None):
     
     # Register blueprints
     from app.routes.auth import auth_bp
-    from app.routes.dashboard import dashboard_bp
+    from app.routes.dashboard import dashboard_bp, init_job_progress
     
     app.register_blueprint(auth_bp)
     app.register_blueprint(dashboard_bp)
+    init_job_progress(app)
     
     # Setup Flask-Admin (creates Admin instance with custom index view)
     from app.routes.admin_views import setup_admin
@@ -96,6 +110,14 @@ def create_app(config_class=Config, test_config=None):
     if app.config['ENABLE_CLEANUP']:
         setup_scheduler(app)
     
+    # Batch audit log inserts off the request path
+    if app.config.get('SYSTEM_LOG_ASYNC'):
+        start_system_log_writer(app)
+    
+    # Warm the Docling converter so the first job does not pay the model load
+    if app.config.get('DOCLING_PRELOAD'):
+        start_docling_preload(app)
+    
     # Cleanup on startup
     if app.config['CLEANUP_ON_STARTUP']:
         with app.app_context():
@@ -159,34 +181,40 @@ def apply_schema_patches(app):
     engine = db.engine
     inspector = inspect(engine)
 
-    try:
-        job_columns = {col['name'] for col in inspector.get_columns('jobs')}
-    except Exception as exc:
-        app.logger.warning(f'Gagal memeriksa skema tabel jobs: {exc}')
-        return
-
-    required_columns = {
-        'question_doc_paths': 'TEXT',
-        'additional_notes': 'TEXT',
-        'question_text': 'TEXT',
+    required_columns_by_table = {
+        'jobs': {
+            'question_doc_paths': 'TEXT',
+            'additional_notes': 'TEXT',
+            'question_text': 'TEXT',
+        },
+        'job_results': {
+            'content_hash': 'VARCHAR(64)',
+        },
     }
 
-    for column_name, sql_type in required_columns.items():
-        if column_name in job_columns:
-            continue
-
+    for table_name, required_columns in required_columns_by_table.items():
         try:
-            with engine.begin() as connection:
-                connection.execute(text(f'ALTER TABLE jobs ADD COLUMN {column_name} {sql_type}'))
-            app.logger.info(f'Migrasi skema: menambahkan kolom jobs.{column_name}')
+            existing_columns = {col['name'] for col in inspector.get_columns(table_name)}
         except Exception as exc:
-            err = str(exc).lower()
-            duplicate_markers = ('duplicate column', 'already exists', 'duplicate column name')
-            if any(marker in err for marker in duplicate_markers):
-                app.logger.info(f'Kolom jobs.{column_name} sudah ada, lanjutkan startup.')
+            app.logger.warning(f'Gagal memeriksa skema tabel {table_name}: {exc}')
+            return
+
+        for column_name, sql_type in required_columns.items():
+            if column_name in existing_columns:
                 continue
-            app.logger.error(f'Gagal menambahkan kolom jobs.{column_name}: {exc}')
-            raise
+
+            try:
+                with engine.begin() as connection:
+                    connection.execute(text(f'ALTER TABLE {table_name} ADD COLUMN {column_name} {sql_type}'))
+                app.logger.info(f'Migrasi skema: menambahkan kolom {table_name}.{column_name}')
+            except Exception as exc:
+                err = str(exc).lower()
+                duplicate_markers = ('duplicate column', 'already exists', 'duplicate column name')
+                if any(marker in err for marker in duplicate_markers):
+                    app.logger.info(f'Kolom {table_name}.{column_name} sudah ada, lanjutkan startup.')
+                    continue
+                app.logger.error(f'Gagal menambahkan kolom {table_name}.{column_name}: {exc}')
+                raise
 
 
 def seed_default_users():
@@ -245,6 +273,36 @@ def log_gpu_status(app):
         app.config['GPU_NAME'] = None
 
 
+def start_system_log_writer(app):
+    """Route SystemLog.log through the batching background writer."""
+    # Keep synchronous inserts in testing mode so tests can read logs immediately
+    if os.environ.get('FLASK_TESTING') or app.config.get('TESTING'):
+        return
+    
+    from app.models import SystemLog
+    from app.services.log_writer_service import SystemLogWriter
+    
+    SystemLog._writer = SystemLogWriter(app).start()
+
+
+def start_docling_preload(app):
+    """Build the shared Docling converter in a background thread."""
+    # Skip model loading in testing mode
+    if os.environ.get('FLASK_TESTING') or app.config.get('TESTING'):
+        return
+    
+    from app.services.docling_service import preload_converter
+    
+    def preload():
+        try:
+            preload_converter(enable_ocr=app.config.get('ENABLE_OCR', True), use_gpu=True)
+            app.logger.info('Docling converter siap digunakan (preload)')
+        except Exception as e:
+            app.logger.warning(f'Preload Docling gagal, converter akan dimuat saat job pertama: {e}')
+    
+    threading.Thread(target=preload, daemon=True, name='DoclingPreload').start()
+
+
 def setup_scheduler(app):
     """Setup APScheduler for cleanup tasks."""
     # Skip scheduler in testing mode
@@ -18,6 +18,13 @@ class Config:
     # Database
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///autoscoring.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_pre_ping': True,
+        'pool_recycle': 3600,
+    }
+    if not SQLALCHEMY_DATABASE_URI.startswith('sqlite'):
+        # SQLite uses its own pool implementations that reject pool sizing arguments
+        SQLALCHEMY_ENGINE_OPTIONS['pool_size'] = int(os.environ.get('DB_POOL_SIZE', 20))
     
     # File upload settings
     MAX_CONTENT_LENGTH = int(os.environ.get('MAX_FILE_SIZE_MB', 50)) * 1024 * 1024  # MB to bytes
@@ -25,6 +32,10 @@ class Config:
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'uploads')
     RESULTS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'results')
     ALLOWED_EXTENSIONS = {'pdf'}
+    # Uploaded parts up to this size stay in memory; larger parts spool to a temp file
+    UPLOAD_SPOOL_MAX_SIZE = int(os.environ.get('UPLOAD_SPOOL_MAX_SIZE_MB', 8)) * 1024 * 1024
+    # Read size used by the multipart parser; larger reads mean fewer parser iterations
+    UPLOAD_PARSE_BUFFER_SIZE = int(os.environ.get('UPLOAD_PARSE_BUFFER_SIZE_KB', 256)) * 1024
     
     # Scoring settings
     DEFAULT_SCORE_MIN = int(os.environ.get('DEFAULT_SCORE_MIN', 40))
@@ -33,6 +44,10 @@ class Config:
     
     # OCR settings
     ENABLE_OCR = os.environ.get('ENABLE_OCR', 'true').lower() == 'true'
+    # Load Docling models when the worker starts instead of on the first job
+    DOCLING_PRELOAD = os.environ.get('DOCLING_PRELOAD', 'false').lower() == 'true'
+    # Worker processes for parsing several documents of one submission on CPU (1 = disabled)
+    DOCLING_MAX_PROCESSES = int(os.environ.get('DOCLING_MAX_PROCESSES', 1))
     
     # Cleanup settings
     ENABLE_CLEANUP = os.environ.get('ENABLE_CLEANUP', 'true').lower() == 'true'
@@ -41,6 +56,12 @@ class Config:
     # Worker settings
     MAX_WORKERS = int(os.environ.get('MAX_WORKERS', 4))
     MAX_RETRIES = int(os.environ.get('MAX_RETRIES', 3))
+    # Optional Redis URL for sharing job progress across workers (requires `redis`)
+    PROGRESS_REDIS_URL = os.environ.get('PROGRESS_REDIS_URL') or None
+    # Jobs scored at the same time; further jobs wait in a queue
+    MAX_CONCURRENT_JOBS = int(os.environ.get('MAX_CONCURRENT_JOBS', 2))
+    # Queue audit log entries and insert them in batches from a background thread
+    SYSTEM_LOG_ASYNC = os.environ.get('SYSTEM_LOG_ASYNC', 'true').lower() == 'true'
     
     # CORS settings
     CORS_ORIGINS = os.environ.get('CORS_ORIGINS', '*')
@@ -76,6 +97,22 @@ class Config:
     OPENROUTER_BASE_URL = os.environ.get('OPENROUTER_BASE_URL', 'https://openrouter.ai/api/v1')
     SILICONFLOW_BASE_URL = os.environ.get('SILICONFLOW_BASE_URL', 'https://api.siliconflow.cn/v1')
     GITHUB_BASE_URL = os.environ.get('GITHUB_BASE_URL', 'https://models.github.ai/inference')
+    # Files that may wait on the LLM provider at once (parsing is still capped by MAX_WORKERS)
+    LLM_CONCURRENCY = int(os.environ.get('LLM_CONCURRENCY', 8))
+    # Sampling temperature for scoring calls (0 = deterministic, cache-friendly)
+    LLM_TEMPERATURE = float(os.environ.get('LLM_TEMPERATURE', 0.0))
+    # Stream responses and stop reading once the JSON result is complete (check provider billing first)
+    LLM_STREAM_RESPONSES = os.environ.get('LLM_STREAM_RESPONSES', 'false').lower() == 'true'
+    # Reuse scoring results for byte-identical prompts (re-grading, duplicate submissions)
+    LLM_CACHE_ENABLED = os.environ.get('LLM_CACHE_ENABLED', 'true').lower() == 'true'
+    LLM_CACHE_TTL_SECONDS = int(os.environ.get('LLM_CACHE_TTL_SECONDS', 3600))
+    LLM_CACHE_MAX_ENTRIES = int(os.environ.get('LLM_CACHE_MAX_ENTRIES', 1024))
+    # Optional Redis URL to share the cache across workers (requires `redis`)
+    LLM_CACHE_REDIS_URL = os.environ.get('LLM_CACHE_REDIS_URL') or None
+    # Reuse results for near-duplicate reports by embedding similarity (requires faiss-cpu, sentence-transformers)
+    SEMANTIC_CACHE_ENABLED = os.environ.get('SEMANTIC_CACHE_ENABLED', 'false').lower() == 'true'
+    SEMANTIC_CACHE_THRESHOLD = float(os.environ.get('SEMANTIC_CACHE_THRESHOLD', 0.92))
+    SEMANTIC_CACHE_MODEL = os.environ.get('SEMANTIC_CACHE_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
 
     # GPU settings (auto-detected)
     GPU_AVAILABLE = False
@@ -138,6 +138,8 @@ class JobResult(db.Model):
     
     # Student info
     filename = db.Column(db.String(255), nullable=False)
+    # SHA-256 of the uploaded file; identical submissions in a job are scored once
+    content_hash = db.Column(db.String(64), nullable=True)
     nim = db.Column(db.String(50), nullable=True)
     student_name = db.Column(db.String(255), nullable=True)
     
@@ -176,9 +178,27 @@ class SystemLog(db.Model):
     def __repr__(self):
         return f'<SystemLog {self.id} - {self.category}>'
     
+    # Background SystemLogWriter set by create_app; None means write synchronously
+    _writer = None
+    
     @classmethod
-    def log(cls, level, category, message, user_id=None, details=None):
-        """Create a new log entry."""
+    def log(cls, level, category, message, user_id=None, details=None, flush=False):
+        """Create a new log entry.
+        
+        With a background writer running, the entry is queued and inserted in a
+        batch (returns None); ``flush=True`` or no writer inserts it immediately.
+        """
+        if cls._writer is not None and not flush:
+            cls._writer.submit({
+                'timestamp': utc_now_naive(),
+                'level': level,
+                'category': category,
+                'message': message,
+                'user_id': user_id,
+                'details': details,
+            })
+            return None
+        
         log_entry = cls(
             level=level,
             category=category,
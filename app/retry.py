@@ -0,0 +1,15 @@
+"""
+Retry backoff helper for AutoScoring application.
+
+Shared by the Docling parser and the Gemini scorer so both back off the same way.
+"""
+
+import random
+
+
+def retry_delay(attempt: int, base: float = 0.5, cap: float = 8.0) -> float:
+    """Jittered exponential backoff delay in seconds for a 0-based retry attempt.
+
+    The jitter keeps parallel workers from retrying in lockstep.
+    """
+    return random.uniform(base, min(cap, base * 3 ** attempt))
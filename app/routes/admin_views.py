@@ -369,6 +369,8 @@ class LLMSettingsView(BaseView):
                 for config_key, config_value in updates.items():
                     db.session.merge(LLMConfig(key=config_key, value=config_value))
                 db.session.commit()
+                from app.services.llm_service import LLMService
+                LLMService.invalidate_config_cache()
 
                 SystemLog.log(
                     'INFO', 'LLM_SETTINGS',
@@ -4,28 +4,65 @@ Dashboard routes for AutoScoring application.
 
 import os
 import json
+import hashlib
+import shutil
 import uuid
+import threading
 import zipfile
-import io
+import zlib
 from datetime import datetime
-from flask import Blueprint, render_template, request, jsonify, current_app, Response, send_file, stream_with_context
+from secrets import token_hex
+from concurrent.futures import ThreadPoolExecutor
+from flask import Blueprint, render_template, request, jsonify, current_app, g, Response, send_file, stream_with_context
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 from werkzeug.exceptions import RequestEntityTooLarge
+from sqlalchemy import insert, select
+from sqlalchemy.orm import load_only
 
 from app.extensions import db
 from app.models import Job, JobResult, SystemLog
+from app.json_provider import dumps_bytes, loads as json_loads
 from app.services.scoring_service import ScoringService
+from app.services.progress_service import create_progress_store
 from app.services.llm_service import LLMService, PROVIDER_KEY_FIELDS
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
-# Store for job progress (in-memory, could use Redis in production)
-job_progress = {}
+# Store for job progress (bounded in-memory, or Redis when PROGRESS_REDIS_URL is set so
+# all workers share it); readers fall back to DB state when an entry is missing.
+# create_app replaces it via init_job_progress() once the app config is known.
+job_progress = create_progress_store()
+
+
+def init_job_progress(app):
+    """Build the job progress store from the app's PROGRESS_REDIS_URL."""
+    global job_progress
+    job_progress = create_progress_store(app.config.get('PROGRESS_REDIS_URL'))
 
 
 def _file_size_bytes(file_storage) -> int:
-    """Return file size in bytes without consuming the stream."""
+    """Return file size in bytes without consuming the stream.
+
+    The measured size is cached on the FileStorage so repeated checks skip the
+    seek/tell round-trip.
+    """
+    cached_size = getattr(file_storage, '_cached_size', None)
+    if cached_size is not None:
+        return cached_size
+
+    size = _measure_file_size(file_storage)
+    file_storage._cached_size = size
+    return size
+
+
+def _measure_file_size(file_storage) -> int:
+    """Measure upload size by seeking to the end of its stream."""
+    # Size-capped parts (see UploadRequest) know their full length even if truncated
+    bytes_received = getattr(getattr(file_storage, 'stream', None), 'bytes_received', None)
+    if bytes_received is not None:
+        return bytes_received
+
     try:
         stream = file_storage.stream
         current_pos = stream.tell()
@@ -58,6 +95,48 @@ def _file_size_bytes(file_storage) -> int:
         raise ValueError('Tidak dapat menentukan ukuran file upload: stream tidak mendukung tell/seek.')
 
 
+UPLOAD_COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def _unique_filenames(files) -> list:
+    """Return collision-safe names for files, drawing all random prefixes in one call."""
+    prefixes = token_hex(4 * len(files))
+    return [
+        f"{prefixes[i * 8:(i + 1) * 8]}_{secure_filename(file.filename)}"
+        for i, file in enumerate(files)
+    ]
+
+
+def _save_fast(file_storage, filepath: str):
+    """Save an upload to ``filepath`` using 1 MiB copy chunks instead of Werkzeug's 16 KiB default."""
+    stream = file_storage.stream
+    stream.seek(0)
+    with open(filepath, 'wb') as dst:
+        shutil.copyfileobj(stream, dst, length=UPLOAD_COPY_CHUNK_SIZE)
+
+
+def _save_and_hash(file_storage, filepath: str, signature: bytes | None = None) -> str | None:
+    """Save an upload to ``filepath`` in one pass and return the SHA-256 hex digest of its content.
+
+    When ``signature`` is given the first chunk must start with it; otherwise
+    nothing is written and None is returned.
+    """
+    stream = file_storage.stream
+    stream.seek(0)
+    chunk = stream.read(UPLOAD_COPY_CHUNK_SIZE)
+    if signature is not None and not chunk.startswith(signature):
+        stream.seek(0)
+        return None
+
+    digest = hashlib.sha256()
+    with open(filepath, 'wb') as dst:
+        while chunk:
+            digest.update(chunk)
+            dst.write(chunk)
+            chunk = stream.read(UPLOAD_COPY_CHUNK_SIZE)
+    return digest.hexdigest()
+
+
 def _validate_file_size(file_storage, max_file_size_bytes: int, label: str) -> str | None:
     """Return localized error message when uploaded file exceeds configured size limit."""
     size_bytes = _file_size_bytes(file_storage)
@@ -71,10 +150,82 @@ def _validate_file_size(file_storage, max_file_size_bytes: int, label: str) -> s
     return None
 
 
+UPLOAD_VALIDATION_MAX_WORKERS = 8
+
+
+def _map_uploads(func, files: list) -> list:
+    """Apply ``func`` to each upload in order, overlapping stream I/O on a small thread pool."""
+    if len(files) < 2:
+        return [func(file) for file in files]
+
+    app = current_app._get_current_object()
+
+    def run_in_app_context(file):
+        with app.app_context():
+            return func(file)
+
+    with ThreadPoolExecutor(max_workers=min(UPLOAD_VALIDATION_MAX_WORKERS, len(files))) as executor:
+        return list(executor.map(run_in_app_context, files))
+
+
+MAX_QUESTION_DOCS = 10
+
+
+def _collect_question_files(question_files_raw: list, max_file_size_bytes: int) -> tuple[list, str | None]:
+    """Filter, size-check and validate question documents in a single pass per file.
+
+    Returns the non-empty files in upload order and the first error, if any.
+    """
+    def check(qfile):
+        if not (qfile and qfile.filename and qfile.filename.strip()):
+            return None, None
+
+        if _file_size_bytes(qfile) == 0:
+            return None, None
+        size_error = _validate_file_size(qfile, max_file_size_bytes, 'Dokumen soal')
+        if size_error:
+            return qfile, size_error
+
+        q_errors = validate_question_doc(qfile)
+        if q_errors:
+            return qfile, f'Dokumen soal tidak valid: {" ".join(q_errors)}'
+        return qfile, None
+
+    checks = _map_uploads(check, question_files_raw)
+    question_files = [qfile for qfile, _ in checks if qfile is not None]
+    if len(question_files) > MAX_QUESTION_DOCS:
+        return question_files, f'Maksimal {MAX_QUESTION_DOCS} file dokumen soal yang diperbolehkan.'
+    return question_files, next((error for _, error in checks if error), None)
+
+
+def _get_active_llm_config() -> dict:
+    """Return the active LLM config, loaded at most once per request."""
+    cfg = getattr(g, '_llm_cfg', None)
+    if cfg is None:
+        cfg = LLMService(current_app.config)._get_active_config()
+        g._llm_cfg = cfg
+    return cfg
+
+
+def _upload_limits() -> dict:
+    """Return the upload limits from app config, computed at most once per request."""
+    limits = getattr(g, '_upload_limits', None)
+    if limits is None:
+        config = current_app.config
+        limits = {
+            'max_count': config['MAX_PDF_COUNT'],
+            'max_file_size_bytes': int(config['MAX_FILE_SIZE_MB']) * 1024 * 1024,
+            'score_min': config['DEFAULT_SCORE_MIN'],
+            'score_max': config['DEFAULT_SCORE_MAX'],
+            'upload_folder': config['UPLOAD_FOLDER'],
+        }
+        g._upload_limits = limits
+    return limits
+
+
 def _validate_llm_provider_ready() -> tuple[bool, str]:
     """Ensure the active provider has the required API key before starting jobs."""
-    llm_service = LLMService(current_app.config)
-    cfg = llm_service._get_active_config()
+    cfg = _get_active_llm_config()
     provider = cfg.get('provider', 'gemini')
 
     if provider == 'gemini':
@@ -100,13 +251,99 @@ def _validate_llm_provider_ready() -> tuple[bool, str]:
     return True, ''
 
 
+def _is_testing_app(app) -> bool:
+    """Return True when background work must run inline (pytest / FLASK_TESTING)."""
+    is_testing_env = str(os.environ.get('FLASK_TESTING', '')).strip().lower() in {
+        '1', 'true', 'yes', 'on'
+    }
+    return bool(app.config.get('TESTING')) or is_testing_env
+
+
+def _init_job_progress(job_id: int, total: int):
+    """Seed in-memory progress so SSE clients see the job immediately."""
+    job_progress[job_id] = {
+        'status': 'pending',
+        'message': 'Menunggu proses...',
+        'progress': 0,
+        'total': total,
+        'current': 0
+    }
+
+
+def _create_job_with_results(job: Job, result_rows: list) -> None:
+    """Insert the job and its pending result rows in a single transaction.
+
+    ``result_rows`` holds the per-file column values collected while saving;
+    job_id and status are shared and bound once for the whole executemany INSERT.
+    """
+    db.session.add(job)
+    db.session.flush()  # assigns job.id without committing
+    db.session.execute(insert(JobResult).values(job_id=job.id, status='pending'), result_rows)
+    db.session.commit()
+
+
+def _finalize_upload(app, job_id: int, job_folder: str, saved_files: list, *,
+                     user_id: int, log_category: str, log_message: str, log_details: dict):
+    """Write the upload audit log and start scoring."""
+    with app.app_context():
+        try:
+            SystemLog.log('INFO', log_category, log_message,
+                          user_id=user_id,
+                          details=json.dumps(log_details))
+
+            scoring_service = ScoringService(app)
+            scoring_service.start_scoring(job_id, job_folder, saved_files, job_progress)
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f'Gagal memulai job {job_id}: {str(e)}')
+            job = db.session.get(Job, job_id)
+            if job:
+                job.status = 'failed'
+                job.status_message = f'Terjadi kesalahan: {str(e)}'
+                db.session.commit()
+            job_progress[job_id] = {
+                'status': 'failed',
+                'message': f'Terjadi kesalahan: {str(e)}',
+                'progress': 0,
+                'total': len(saved_files),
+                'current': 0
+            }
+
+
+UPLOAD_FINALIZE_MAX_WORKERS = 4
+
+_finalize_executor = None
+_finalize_executor_lock = threading.Lock()
+
+
+def _get_finalize_executor() -> ThreadPoolExecutor:
+    """Return the shared, bounded executor that runs post-upload work."""
+    global _finalize_executor
+    with _finalize_executor_lock:
+        if _finalize_executor is None:
+            _finalize_executor = ThreadPoolExecutor(
+                max_workers=UPLOAD_FINALIZE_MAX_WORKERS,
+                thread_name_prefix='UploadFinalize'
+            )
+        return _finalize_executor
+
+
+def _dispatch_upload_finalize(app, job_id: int, job_folder: str, saved_files: list, **kwargs):
+    """Queue _finalize_upload on the background executor so the upload request can return early."""
+    if _is_testing_app(app):
+        # Same rule as ScoringService.start_scoring: no background DB writes under tests.
+        _finalize_upload(app, job_id, job_folder, saved_files, **kwargs)
+        return
+
+    _get_finalize_executor().submit(_finalize_upload, app, job_id, job_folder, saved_files, **kwargs)
+
+
 @dashboard_bp.route('/api/llm-readiness', methods=['GET'])
 @login_required
 def llm_readiness():
     """Return whether the active LLM provider is ready for scoring jobs."""
     ready, message = _validate_llm_provider_ready()
-    llm_service = LLMService(current_app.config)
-    cfg = llm_service._get_active_config()
+    cfg = _get_active_llm_config()
     return jsonify({
         'success': True,
         'ready': ready,
@@ -115,26 +352,53 @@ def llm_readiness():
     })
 
 
+def _filename_ext(filename: str) -> str:
+    """Return the lowercase extension of ``filename`` without the dot ('' when absent)."""
+    _, dot, ext = (filename or '').rpartition('.')
+    return ext.lower() if dot else ''
+
+
+def _ext(file_storage) -> str:
+    """Return the upload's lowercase extension, memoized on the FileStorage."""
+    ext = getattr(file_storage, '_ext_cache', None)
+    if ext is None:
+        ext = _filename_ext(file_storage.filename)
+        file_storage._ext_cache = ext
+    return ext
+
+
+def _mime(file_storage) -> str:
+    """Return the upload's bare, lowercase MIME type, parsed once and memoized."""
+    mime = getattr(file_storage, '_mime_cache', None)
+    if mime is None:
+        mime = (file_storage.content_type or '').split(';', 1)[0].strip().lower()
+        file_storage._mime_cache = mime
+    return mime
+
+
 def allowed_file(filename):
     """Check if file extension is allowed."""
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in current_app.config['ALLOWED_EXTENSIONS']
+    return _filename_ext(filename) in current_app.config['ALLOWED_EXTENSIONS']
 
 
 # Allowed extensions for question documents (PDF, DOCX, plain text, images)
 # NOTE: SVG removed due to XSS risk (requires server-side sanitization if needed)
 # NOTE: RAW camera formats (cr2, nef, arw) removed - not commonly used for exam docs
-QUESTION_DOC_EXTENSIONS = {
+TEXT_DOC_EXTENSIONS = frozenset({'txt', 'md', 'markdown'})
+IMAGE_DOC_EXTENSIONS = frozenset({
+    'jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp', 'heic', 'heif',
+    'tiff', 'tif'
+})
+QUESTION_DOC_EXTENSIONS = frozenset({
     'pdf', 'doc', 'docx',
     # Plain text formats
-    'txt', 'md', 'markdown',
+    *TEXT_DOC_EXTENSIONS,
     # Images (common raster formats only)
-    'jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp', 'heic', 'heif', 
-    'tiff', 'tif'
-}
+    *IMAGE_DOC_EXTENSIONS,
+})
 
 # MIME types for question documents validation
-QUESTION_DOC_MIME_TYPES = {
+QUESTION_DOC_MIME_TYPES = frozenset({
     # Documents
     'application/pdf',
     'application/msword',
@@ -144,7 +408,9 @@ QUESTION_DOC_MIME_TYPES = {
     # Images
     'image/jpeg', 'image/png', 'image/gif', 'image/bmp', 'image/webp',
     'image/heic', 'image/heif', 'image/tiff',
-}
+})
+
+PDF_MIME_TYPES = frozenset({'application/pdf', 'application/x-pdf'})
 
 # Magic bytes signatures for file validation
 FILE_SIGNATURES = {
@@ -161,37 +427,63 @@ FILE_SIGNATURES = {
 
 # HEIC/HEIF brand codes (ISO Base Media File Format)
 # These distinguish HEIC from MP4, MOV, M4A etc.
-HEIC_HEIF_BRANDS = {
+HEIC_HEIF_BRANDS = frozenset({
     b'heic', b'heix', b'hevc', b'hevx',  # HEIC brands
     b'heif', b'heim', b'heis', b'hevs',  # HEIF brands  
     b'mif1', b'msf1',  # MIAF brands
-}
+})
+
+
+DOCX_CONTENT_TYPE_MARKER = b'application/vnd.openxmlformats-officedocument.wordprocessingml'
+DOCX_CONTENT_TYPES_SCAN_LIMIT = 64 * 1024
+DOCX_SCAN_CHUNK_SIZE = 8192
+
+
+# Errors zipfile raises for corrupt, truncated, encrypted (RuntimeError) or
+# unsupported-compression (NotImplementedError) archives. Anything else is a bug.
+DOCX_READ_ERRORS = (zipfile.BadZipFile, zipfile.LargeZipFile, KeyError, OSError, EOFError,
+                    RuntimeError, zlib.error)
 
 
-def is_valid_docx(file_content: bytes) -> bool:
+def _stream_contains(stream, marker: bytes, limit: int) -> bool:
+    """Return True if ``marker`` occurs within the first ``limit`` bytes of ``stream``."""
+    tail = b''
+    scanned = 0
+    while scanned < limit:
+        chunk = stream.read(DOCX_SCAN_CHUNK_SIZE)
+        if not chunk:
+            return False
+        window = tail + chunk
+        if marker in window:
+            return True
+        # Keep enough bytes to catch a marker split across chunk boundaries
+        tail = window[-(len(marker) - 1):]
+        scanned += len(chunk)
+    return False
+
+
+def is_valid_docx(stream) -> bool:
     """
     Validate DOCX by checking internal ZIP structure for Office Open XML markers.
     Returns True only if it's a genuine Word document, not just any ZIP file.
+
+    ``stream`` must be seekable; ZipFile reads the central directory from it
+    directly, so the upload is never copied into memory. The stream is
+    rewound afterwards.
     """
     try:
-        with zipfile.ZipFile(io.BytesIO(file_content), 'r') as zf:
-            namelist = zf.namelist()
-            # DOCX must have [Content_Types].xml at root
-            if '[Content_Types].xml' not in namelist:
+        with zipfile.ZipFile(stream, 'r') as zf:
+            names = set(zf.namelist())
+            # DOCX must have [Content_Types].xml at root and word/document.xml
+            if '[Content_Types].xml' not in names or 'word/document.xml' not in names:
                 return False
-            # DOCX must have word/ directory with document.xml
-            if 'word/document.xml' not in namelist:
-                return False
-            # Verify Content_Types contains Word-specific content type
-            try:
-                content_types = zf.read('[Content_Types].xml').decode('utf-8', errors='ignore')
-                if 'application/vnd.openxmlformats-officedocument.wordprocessingml' not in content_types:
-                    return False
-            except:
-                return False
-            return True
-    except (zipfile.BadZipFile, Exception):
+            # Verify Content_Types declares a Word content type; scan it incrementally
+            with zf.open('[Content_Types].xml') as content_types:
+                return _stream_contains(content_types, DOCX_CONTENT_TYPE_MARKER, DOCX_CONTENT_TYPES_SCAN_LIMIT)
+    except DOCX_READ_ERRORS:
         return False
+    finally:
+        stream.seek(0)
 
 
 def is_valid_heic_heif(header: bytes) -> bool:
@@ -200,38 +492,78 @@ def is_valid_heic_heif(header: bytes) -> bool:
     Prevents false positives from MP4, MOV, M4A which also use ftyp.
     """
     # ISO Base Media File Format: first 4 bytes = box size, next 4 bytes = 'ftyp'
-    if len(header) < 12:
-        return False
-    
-    # Check for ftyp box marker at bytes 4-7
-    if header[4:8] != b'ftyp':
+    if len(header) < 12 or not header.startswith(b'ftyp', 4):
         return False
     
     # Major brand is at bytes 8-12
-    major_brand = header[8:12]
-    if major_brand in HEIC_HEIF_BRANDS:
+    if header[8:12] in HEIC_HEIF_BRANDS:
         return True
     
-    # Also check compatible brands (after major brand and version)
-    # Compatible brands start at byte 16 and continue in 4-byte chunks
-    if len(header) >= 20:
-        for i in range(16, min(len(header), 64), 4):
-            if i + 4 <= len(header):
-                brand = header[i:i+4]
-                if brand in HEIC_HEIF_BRANDS:
-                    return True
-    
-    return False
+    # Compatible brands start at byte 16 and continue in 4-byte aligned chunks.
+    # A regex search is deliberately avoided: unaligned matches would accept MP4/MOV
+    # files whose brand bytes merely straddle two compatible-brand slots.
+    end = min(len(header), HEADER_PEEK_SIZE) - 3
+    return any(header[i:i + 4] in HEIC_HEIF_BRANDS for i in range(16, end, 4))
 
 
 def allowed_question_doc(filename):
     """Check if file extension is allowed for question documents."""
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in QUESTION_DOC_EXTENSIONS
+    return _filename_ext(filename) in QUESTION_DOC_EXTENSIONS
+
+
+def _starts_with(signature):
+    """Build a signature validator matching ``signature`` (bytes or tuple of bytes) at offset 0."""
+    return lambda header, file: header.startswith(signature)
+
+
+# Magic-byte validators keyed by extension: (header, file_storage) -> bool
+_SIG_VALIDATORS = {
+    'pdf': _starts_with(FILE_SIGNATURES['pdf']),
+    'jpg': _starts_with(FILE_SIGNATURES['jpg']),
+    'jpeg': _starts_with(FILE_SIGNATURES['jpg']),
+    'png': _starts_with(FILE_SIGNATURES['png']),
+    'gif': _starts_with(FILE_SIGNATURES['gif']),
+    'bmp': _starts_with(FILE_SIGNATURES['bmp']),
+    'tiff': _starts_with(FILE_SIGNATURES['tiff']),
+    'tif': _starts_with(FILE_SIGNATURES['tiff']),
+    'webp': lambda header, file: header.startswith(FILE_SIGNATURES['webp']) and header.startswith(b'WEBP', 8),
+    # DOCX requires deep validation - check ZIP structure and Word-specific files
+    'docx': lambda header, file: header.startswith(FILE_SIGNATURES['zip']) and is_valid_docx(file.stream),
+    'doc': _starts_with(FILE_SIGNATURES['doc']),
+    # HEIC/HEIF requires proper brand validation to distinguish from MP4/MOV
+    'heic': lambda header, file: is_valid_heic_heif(header),
+    'heif': lambda header, file: is_valid_heic_heif(header),
+}
+
+
+HEADER_PEEK_SIZE = 64  # Enough for every signature check, including HEIC brand lists
 
 
-def validate_pdf(file):
-    """Validate PDF file thoroughly."""
+def _peek_header(file_storage, size: int = HEADER_PEEK_SIZE) -> bytes:
+    """Return the first ``size`` bytes of an upload without consuming its stream.
+
+    The first HEADER_PEEK_SIZE bytes are read once and cached on the FileStorage,
+    so every validator shares a single seek/read/seek of the upload stream.
+    """
+    header = getattr(file_storage, '_cached_header', None)
+    if header is None:
+        header = _read_header(file_storage.stream, HEADER_PEEK_SIZE)
+        file_storage._cached_header = header
+    return header[:size]
+
+
+def _read_header(stream, size: int) -> bytes:
+    stream.seek(0)
+    header = stream.read(size)
+    stream.seek(0)
+    return header
+
+
+def validate_pdf(file, check_header: bool = True):
+    """Validate PDF file thoroughly.
+
+    Pass ``check_header=False`` when the magic bytes are verified while saving (see _save_and_hash).
+    """
     errors = []
     
     # Check filename extension
@@ -239,27 +571,28 @@ def validate_pdf(file):
         errors.append('Nama file tidak valid.')
         return errors
     
-    if not allowed_file(file.filename):
+    if _ext(file) not in current_app.config['ALLOWED_EXTENSIONS']:
         errors.append(f'File {file.filename} bukan format PDF.')
         return errors
     
     # Check MIME type
-    if file.content_type not in ['application/pdf', 'application/x-pdf']:
-        errors.append(f'File {file.filename} memiliki tipe MIME tidak valid: {file.content_type}')
+    if _mime(file) not in PDF_MIME_TYPES:
+        errors.append(f'File {file.filename} memiliki tipe MIME tidak valid: {_mime(file)}')
     
     # Check PDF magic bytes (header)
-    file.seek(0)
-    header = file.read(5)
-    file.seek(0)  # Reset file pointer
-    
-    if header != b'%PDF-':
-        errors.append(f'File {file.filename} bukan file PDF yang valid (header tidak sesuai).')
+    if check_header and not _peek_header(file).startswith(FILE_SIGNATURES['pdf']):
+        errors.append(_pdf_header_error(file))
     
     return errors
 
 
+def _pdf_header_error(file) -> str:
+    """Return localized error for an upload whose PDF header does not match."""
+    return f'File {file.filename} bukan file PDF yang valid (header tidak sesuai).'
+
+
 # Allowed extensions for answer key (PDF and plain text)
-ANSWER_KEY_EXTENSIONS = {'pdf', 'txt', 'md', 'markdown'}
+ANSWER_KEY_EXTENSIONS = frozenset({'pdf', *TEXT_DOC_EXTENSIONS})
 
 def validate_answer_key(file):
     """Validate answer key file (PDF, TXT, or MD)."""
@@ -269,25 +602,21 @@ def validate_answer_key(file):
         errors.append('Nama file tidak valid.')
         return errors
     
-    ext = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else ''
+    ext = _ext(file)
     if ext not in ANSWER_KEY_EXTENSIONS:
         errors.append(f'File {file.filename} memiliki ekstensi tidak didukung. Gunakan PDF, TXT, atau MD.')
         return errors
     
     # Plain text files don't need strict validation
-    if ext in {'txt', 'md', 'markdown'}:
+    if ext in TEXT_DOC_EXTENSIONS:
         return errors
     
     # PDF validation
     if ext == 'pdf':
-        if file.content_type not in ['application/pdf', 'application/x-pdf']:
-            errors.append(f'File {file.filename} memiliki tipe MIME tidak valid: {file.content_type}')
+        if _mime(file) not in PDF_MIME_TYPES:
+            errors.append(f'File {file.filename} memiliki tipe MIME tidak valid: {_mime(file)}')
         
-        file.seek(0)
-        header = file.read(5)
-        file.seek(0)
-        
-        if header != b'%PDF-':
+        if not _peek_header(file).startswith(FILE_SIGNATURES['pdf']):
             errors.append(f'File {file.filename} bukan file PDF yang valid.')
     
     return errors
@@ -302,76 +631,63 @@ def validate_question_doc(file):
         errors.append('Nama file tidak valid.')
         return errors
     
-    if not allowed_question_doc(file.filename):
-        ext = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else 'unknown'
-        errors.append(f'File {file.filename} memiliki ekstensi tidak didukung: .{ext}')
+    ext = _ext(file)
+    if ext not in QUESTION_DOC_EXTENSIONS:
+        errors.append(f'File {file.filename} memiliki ekstensi tidak didukung: .{ext or "unknown"}')
         return errors
     
-    ext = file.filename.rsplit('.', 1)[1].lower()
-    
     # Plain text files don't need strict MIME/signature validation
-    if ext in {'txt', 'md', 'markdown'}:
+    if ext in TEXT_DOC_EXTENSIONS:
         return errors  # Allow plain text files without strict validation
     
-    # Check MIME type
-    mime_type = file.content_type or file.mimetype
-    # Allow generic image/* for images, or check specific MIME types
-    is_image_ext = ext in {'jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp', 'heic', 'heif', 'tiff', 'tif'}
-    mime_valid = (
-        mime_type in QUESTION_DOC_MIME_TYPES or
-        (is_image_ext and mime_type and mime_type.startswith('image/'))
-    )
-    if not mime_valid and mime_type:
-        errors.append(f'File {file.filename} memiliki tipe MIME tidak valid: {mime_type}')
-    
-    # Check magic bytes (file signature)
-    file.seek(0)
-    header = file.read(64)  # Read more bytes for HEIC brand detection
-    file.seek(0)  # Reset file pointer
-    
-    signature_valid = False
-    
-    if ext == 'pdf':
-        signature_valid = header.startswith(FILE_SIGNATURES['pdf'])
-    elif ext in {'jpg', 'jpeg'}:
-        signature_valid = header.startswith(FILE_SIGNATURES['jpg'])
-    elif ext == 'png':
-        signature_valid = header.startswith(FILE_SIGNATURES['png'])
-    elif ext == 'gif':
-        signature_valid = header.startswith(FILE_SIGNATURES['gif'][0]) or header.startswith(FILE_SIGNATURES['gif'][1])
-    elif ext == 'bmp':
-        signature_valid = header.startswith(FILE_SIGNATURES['bmp'])
-    elif ext in {'tiff', 'tif'}:
-        signature_valid = header.startswith(FILE_SIGNATURES['tiff'][0]) or header.startswith(FILE_SIGNATURES['tiff'][1])
-    elif ext == 'webp':
-        signature_valid = header.startswith(FILE_SIGNATURES['webp']) and b'WEBP' in header[:12]
-    elif ext == 'docx':
-        # DOCX requires deep validation - check ZIP structure and Word-specific files
-        if header.startswith(FILE_SIGNATURES['zip']):
-            file.seek(0)
-            file_content = file.read()
-            file.seek(0)
-            signature_valid = is_valid_docx(file_content)
-        else:
-            signature_valid = False
-    elif ext == 'doc':
-        signature_valid = header.startswith(FILE_SIGNATURES['doc'])
-    elif ext in {'heic', 'heif'}:
-        # HEIC/HEIF requires proper brand validation to distinguish from MP4/MOV
-        signature_valid = is_valid_heic_heif(header)
-    else:
+    # Check magic bytes (file signature) first: unlike the MIME type, the
+    # content cannot be spoofed by the client, and a mismatch ends validation.
+    validator = _SIG_VALIDATORS.get(ext)
+    if validator is None:
         # Unknown extension - fail-safe: reject files without explicit signature handler
         # This prevents bypassing validation if new extensions are added without signature checks
-        signature_valid = False
         errors.append(f'File {file.filename} memiliki ekstensi (.{ext}) yang belum memiliki validasi signature.')
         return errors
     
-    if not signature_valid:
+    if not validator(_peek_header(file), file):
         errors.append(f'File {file.filename} memiliki signature tidak valid (kemungkinan file corrupt atau format tidak sesuai).')
+        return errors
+    
+    # MIME type is a secondary sanity check on a file whose bytes already match
+    mime_type = _mime(file)
+    # Allow generic image/* for images, or check specific MIME types
+    mime_valid = (
+        mime_type in QUESTION_DOC_MIME_TYPES or
+        (ext in IMAGE_DOC_EXTENSIONS and mime_type.startswith('image/'))
+    )
+    if not mime_valid and mime_type:
+        errors.append(f'File {file.filename} memiliki tipe MIME tidak valid: {mime_type}')
     
     return errors
 
 
+def _exceeds_request_limit() -> bool:
+    """Check the declared Content-Length against the request limit before any body is parsed."""
+    max_length = current_app.config.get('MAX_CONTENT_LENGTH')
+    content_length = request.content_length or 0
+    return bool(max_length) and content_length > max_length
+
+
+def _request_too_large_response():
+    """Return the localized 413 JSON response for oversized uploads."""
+    max_mb = int(current_app.config.get('MAX_FILE_SIZE_MB', 10))
+    return jsonify({
+        'success': False,
+        'error': f'Total ukuran upload melebihi batas maksimum request ({max_mb} MB).'
+    }), 413
+
+
+@dashboard_bp.errorhandler(RequestEntityTooLarge)
+def handle_request_too_large(error):
+    """Answer with JSON when Werkzeug rejects the body during parsing (e.g. in CSRF checks)."""
+    return _request_too_large_response()
+
+
 @dashboard_bp.route('/dashboard')
 @login_required
 def index():
@@ -393,10 +709,14 @@ def index():
 @login_required
 def upload_files():
     """Handle file upload and create scoring job."""
+    if _exceeds_request_limit():
+        return _request_too_large_response()
+
     try:
         # Get form data
-        score_min = int(request.form.get('score_min', current_app.config['DEFAULT_SCORE_MIN']))
-        score_max = int(request.form.get('score_max', current_app.config['DEFAULT_SCORE_MAX']))
+        limits = _upload_limits()
+        score_min = int(request.form.get('score_min', limits['score_min']))
+        score_max = int(request.form.get('score_max', limits['score_max']))
         enable_evaluation = request.form.get('enable_evaluation', 'true').lower() == 'true'
         additional_notes = request.form.get('additional_notes', '').strip() or None
         question_text = request.form.get('question_text', '').strip() or None
@@ -416,8 +736,8 @@ def upload_files():
         if not provider_ready:
             return jsonify({'success': False, 'error': provider_error}), 400
 
-        max_count = current_app.config['MAX_PDF_COUNT']
-        max_file_size_bytes = int(current_app.config['MAX_FILE_SIZE_MB']) * 1024 * 1024
+        max_count = limits['max_count']
+        max_file_size_bytes = limits['max_file_size_bytes']
 
         # Get student files
         student_files = request.files.getlist('student_files')
@@ -429,24 +749,29 @@ def upload_files():
         if len(student_files) > max_count:
             return jsonify({'success': False, 'error': f'Jumlah file melebihi batas maksimum ({max_count} file).'}), 400
 
-        # Check configured file-size limit per uploaded student file
-        for file in student_files:
-            if file and file.filename:
-                size_error = _validate_file_size(file, max_file_size_bytes, 'File')
-                if size_error:
-                    return jsonify({'success': False, 'error': size_error}), 400
-        
-        # Validate all PDF files
+        # Check size limits, names and MIME types concurrently;
+        # PDF magic bytes are checked in the save pass below
+        named_files = [file for file in student_files if file and file.filename]
+        checks = _map_uploads(
+            lambda file: (
+                _validate_file_size(file, max_file_size_bytes, 'File'),
+                validate_pdf(file, check_header=False),
+            ),
+            named_files,
+        )
+
+        size_error = next((size_error for size_error, _ in checks if size_error), None)
+        if size_error:
+            return jsonify({'success': False, 'error': size_error}), 400
+
         all_errors = []
         valid_files = []
         
-        for file in student_files:
-            if file.filename:
-                errors = validate_pdf(file)
-                if errors:
-                    all_errors.extend(errors)
-                else:
-                    valid_files.append(file)
+        for file, (_, errors) in zip(named_files, checks):
+            if errors:
+                all_errors.extend(errors)
+            else:
+                valid_files.append(file)
         
         if all_errors:
             return jsonify({'success': False, 'error': ' '.join(all_errors)}), 400
@@ -456,25 +781,32 @@ def upload_files():
         
         # Create job folder
         job_id = str(uuid.uuid4())
-        job_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], job_id)
-        os.makedirs(job_folder, exist_ok=True)
+        job_folder = os.path.join(limits['upload_folder'], job_id)
         
-        # Save student files
+        # Save student files (makedirs creates the job folder as a side effect)
         student_folder = os.path.join(job_folder, 'students')
         os.makedirs(student_folder, exist_ok=True)
         
         saved_files = []
-        for file in valid_files:
-            filename = secure_filename(file.filename)
-            # Add UUID prefix to avoid duplicates
-            unique_filename = f"{uuid.uuid4().hex[:8]}_{filename}"
+        result_rows = []
+        for file, unique_filename in zip(valid_files, _unique_filenames(valid_files)):
             filepath = os.path.join(student_folder, unique_filename)
-            file.save(filepath)
+            # Single pass: verify the PDF header, write to disk and hash the content
+            content_hash = _save_and_hash(file, filepath, signature=FILE_SIGNATURES['pdf'])
+            if content_hash is None:
+                all_errors.append(_pdf_header_error(file))
+                continue
             saved_files.append({
                 'original_name': file.filename,
                 'saved_name': unique_filename,
-                'path': filepath
+                'path': filepath,
+                'content_hash': content_hash
             })
+            result_rows.append({'filename': file.filename, 'content_hash': content_hash})
+
+        if all_errors:
+            shutil.rmtree(job_folder, ignore_errors=True)
+            return jsonify({'success': False, 'error': ' '.join(all_errors)}), 400
         
         # Handle answer key (optional - supports PDF, TXT, MD)
         answer_key_path = None
@@ -490,45 +822,25 @@ def upload_files():
             
             ak_filename = secure_filename(answer_key_file.filename)
             answer_key_path = os.path.join(job_folder, f"answer_key_{ak_filename}")
-            answer_key_file.save(answer_key_path)
+            _save_fast(answer_key_file, answer_key_path)
         
         # Handle question documents (optional, up to 10 files)
         question_doc_paths_list = []
         question_files_raw = request.files.getlist('question_documents')
         
-        # Filter out empty FileStorage entries
-        question_files = []
-        for qf in question_files_raw:
-            if qf and qf.filename and qf.filename.strip():
-                size = _file_size_bytes(qf)
-                if size > 0:
-                    question_files.append(qf)
+        question_files, question_error = _collect_question_files(question_files_raw, max_file_size_bytes)
+        if question_error:
+            return jsonify({'success': False, 'error': question_error}), 400
         
         if question_files:
-            # Check maximum 10 files (after filtering)
-            if len(question_files) > 10:
-                return jsonify({'success': False, 'error': 'Maksimal 10 file dokumen soal yang diperbolehkan.'}), 400
-            
-            # Validate all files first before creating folder
-            for qfile in question_files:
-                size_error = _validate_file_size(qfile, max_file_size_bytes, 'Dokumen soal')
-                if size_error:
-                    return jsonify({'success': False, 'error': size_error}), 400
-
-                q_errors = validate_question_doc(qfile)
-                if q_errors:
-                    return jsonify({'success': False, 'error': f'Dokumen soal tidak valid: {" ".join(q_errors)}'}), 400
-            
             # Create folder only after all validations pass
             question_folder = os.path.join(job_folder, 'questions')
             os.makedirs(question_folder, exist_ok=True)
             
             try:
-                for qfile in question_files:
-                    q_filename = secure_filename(qfile.filename)
-                    unique_q_filename = f"{uuid.uuid4().hex[:8]}_{q_filename}"
+                for qfile, unique_q_filename in zip(question_files, _unique_filenames(question_files)):
                     q_filepath = os.path.join(question_folder, unique_q_filename)
-                    qfile.save(q_filepath)
+                    _save_fast(qfile, q_filepath)
                     question_doc_paths_list.append(q_filepath)
             except Exception as save_error:
                 # Cleanup already saved files on error
@@ -547,7 +859,7 @@ def upload_files():
                 return jsonify({'success': False, 'error': f'Gagal menyimpan dokumen soal: {str(save_error)}'}), 500
         
         # Convert question doc paths to JSON string for storage
-        question_doc_paths_json = json.dumps(question_doc_paths_list) if question_doc_paths_list else None
+        question_doc_paths_json = dumps_bytes(question_doc_paths_list).decode('utf-8') if question_doc_paths_list else None
         
         # Validate at least one reference is provided
         has_answer_key = answer_key_path is not None
@@ -571,51 +883,33 @@ def upload_files():
             total_files=len(saved_files),
             status='pending'
         )
-        db.session.add(job)
-        db.session.commit()
-        
-        # Create job results for each file
-        for file_info in saved_files:
-            result = JobResult(
-                job_id=job.id,
-                filename=file_info['original_name'],
-                status='pending'
-            )
-            db.session.add(result)
-        db.session.commit()
+        _create_job_with_results(job, result_rows)
         
-        # Log upload
         current_app.logger.info(f'Upload: {len(saved_files)} file oleh {current_user.username}')
-        SystemLog.log('INFO', 'upload', 
-                     f'Upload {len(saved_files)} file mahasiswa', 
-                     user_id=current_user.id,
-                     details=json.dumps({'job_id': job.id, 'file_count': len(saved_files)}))
-        
-        # Initialize progress tracking
-        job_progress[job.id] = {
-            'status': 'pending',
-            'message': 'Menunggu proses...',
-            'progress': 0,
-            'total': len(saved_files),
-            'current': 0
-        }
-        
-        # Start scoring process in background
-        scoring_service = ScoringService(current_app._get_current_object())
-        scoring_service.start_scoring(job.id, job_folder, saved_files, job_progress)
+
+        # Publish progress before handing off so SSE subscribers never miss the first state.
+        _init_job_progress(job.id, len(saved_files))
+
+        # Audit log and scoring start are finished off the request thread.
+        _dispatch_upload_finalize(
+            current_app._get_current_object(),
+            job.id,
+            job_folder,
+            saved_files,
+            user_id=current_user.id,
+            log_category='upload',
+            log_message=f'Upload {len(saved_files)} file mahasiswa',
+            log_details={'job_id': job.id, 'file_count': len(saved_files)},
+        )
         
         return jsonify({
             'success': True,
             'job_id': job.id,
             'message': f'Berhasil mengunggah {len(saved_files)} file. Proses penilaian dimulai.'
-        })
+        }), 202
         
     except RequestEntityTooLarge:
-        max_mb = int(current_app.config.get('MAX_FILE_SIZE_MB', 10))
-        return jsonify({
-            'success': False,
-            'error': f'Total ukuran upload melebihi batas maksimum request ({max_mb} MB).'
-        }), 413
+        return _request_too_large_response()
     except Exception as e:
         current_app.logger.error(f'Error upload: {str(e)}')
         SystemLog.log('ERROR', 'upload', f'Error upload: {str(e)}', user_id=current_user.id)
@@ -626,10 +920,14 @@ def upload_files():
 @login_required
 def upload_single():
     """Handle single processing upload - one student at a time with multiple files per student."""
+    if _exceeds_request_limit():
+        return _request_too_large_response()
+
     try:
         # Get form data
-        score_min = int(request.form.get('score_min', current_app.config['DEFAULT_SCORE_MIN']))
-        score_max = int(request.form.get('score_max', current_app.config['DEFAULT_SCORE_MAX']))
+        limits = _upload_limits()
+        score_min = int(request.form.get('score_min', limits['score_min']))
+        score_max = int(request.form.get('score_max', limits['score_max']))
         enable_evaluation = request.form.get('enable_evaluation', 'true').lower() == 'true'
         additional_notes = request.form.get('additional_notes', '').strip() or None
         question_text = request.form.get('question_text', '').strip() or None
@@ -649,13 +947,13 @@ def upload_single():
         if not provider_ready:
             return jsonify({'success': False, 'error': provider_error}), 400
 
-        max_count = current_app.config['MAX_PDF_COUNT']
-        max_file_size_bytes = int(current_app.config['MAX_FILE_SIZE_MB']) * 1024 * 1024
+        max_count = limits['max_count']
+        max_file_size_bytes = limits['max_file_size_bytes']
 
         # Get students data
         students_data_str = request.form.get('students_data', '[]')
         try:
-            students_data = json.loads(students_data_str)
+            students_data = json_loads(students_data_str)
         except json.JSONDecodeError:
             return jsonify({'success': False, 'error': 'Data mahasiswa tidak valid.'}), 400
         
@@ -675,8 +973,9 @@ def upload_single():
 
         # Create job folder
         job_id = str(uuid.uuid4())
-        job_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], job_id)
-        os.makedirs(job_folder, exist_ok=True)
+        job_folder = os.path.join(limits['upload_folder'], job_id)
+        student_folder = os.path.join(job_folder, 'students')
+        os.makedirs(student_folder, exist_ok=True)
         
         # Handle answer key (optional - supports PDF, TXT, MD)
         answer_key_path = None
@@ -692,48 +991,30 @@ def upload_single():
             
             ak_filename = secure_filename(answer_key_file.filename)
             answer_key_path = os.path.join(job_folder, f"answer_key_{ak_filename}")
-            answer_key_file.save(answer_key_path)
+            _save_fast(answer_key_file, answer_key_path)
         
         # Handle question documents (optional, up to 10 files)
         question_doc_paths_list = []
         question_files_raw = request.files.getlist('question_documents')
         
-        question_files = []
-        for qf in question_files_raw:
-            if qf and qf.filename and qf.filename.strip():
-                size = _file_size_bytes(qf)
-                if size > 0:
-                    question_files.append(qf)
+        question_files, question_error = _collect_question_files(question_files_raw, max_file_size_bytes)
+        if question_error:
+            return jsonify({'success': False, 'error': question_error}), 400
         
         if question_files:
-            if len(question_files) > 10:
-                return jsonify({'success': False, 'error': 'Maksimal 10 file dokumen soal yang diperbolehkan.'}), 400
-            
-            for qfile in question_files:
-                size_error = _validate_file_size(qfile, max_file_size_bytes, 'Dokumen soal')
-                if size_error:
-                    return jsonify({'success': False, 'error': size_error}), 400
-
-                q_errors = validate_question_doc(qfile)
-                if q_errors:
-                    return jsonify({'success': False, 'error': f'Dokumen soal tidak valid: {" ".join(q_errors)}'}), 400
-            
             question_folder = os.path.join(job_folder, 'questions')
             os.makedirs(question_folder, exist_ok=True)
             
-            for qfile in question_files:
-                q_filename = secure_filename(qfile.filename)
-                unique_q_filename = f"{uuid.uuid4().hex[:8]}_{q_filename}"
+            for qfile, unique_q_filename in zip(question_files, _unique_filenames(question_files)):
                 q_filepath = os.path.join(question_folder, unique_q_filename)
-                qfile.save(q_filepath)
+                _save_fast(qfile, q_filepath)
                 question_doc_paths_list.append(q_filepath)
         
-        question_doc_paths_json = json.dumps(question_doc_paths_list) if question_doc_paths_list else None
+        question_doc_paths_json = dumps_bytes(question_doc_paths_list).decode('utf-8') if question_doc_paths_list else None
         
         # Process each student
         saved_files = []
-        student_folder = os.path.join(job_folder, 'students')
-        os.makedirs(student_folder, exist_ok=True)
+        result_rows = []
         
         for student_index, student in enumerate(students_data):
             # Students no longer provide NIM/name manually, LLM will extract it
@@ -751,26 +1032,27 @@ def upload_single():
             student_subfolder = os.path.join(student_folder, f"{student_index}")
             os.makedirs(student_subfolder, exist_ok=True)
             
-            # Validate and save student files
-            student_file_paths = []
-            source_filename = None
-            for file in non_empty_student_files:
-                size_error = _validate_file_size(file, max_file_size_bytes, 'File jawaban')
+            # Validate student files concurrently, reporting the first error in upload order
+            checks = _map_uploads(
+                lambda file: (
+                    _validate_file_size(file, max_file_size_bytes, 'File jawaban'),
+                    validate_question_doc(file),
+                ),
+                non_empty_student_files,
+            )
+            for size_error, q_errors in checks:
                 if size_error:
                     return jsonify({'success': False, 'error': size_error}), 400
-
-                # Validate file
-                q_errors = validate_question_doc(file)
                 if q_errors:
                     return jsonify({'success': False, 'error': f'File jawaban tidak valid untuk mahasiswa nomor {student_index + 1}: {" ".join(q_errors)}'}), 400
-                
-                filename = secure_filename(file.filename)
-                if source_filename is None:
-                    source_filename = file.filename
-                unique_filename = f"{uuid.uuid4().hex[:8]}_{filename}"
-                filepath = os.path.join(student_subfolder, unique_filename)
-                file.save(filepath)
-                student_file_paths.append(filepath)
+            
+            # Save all files of this student with overlapping disk writes
+            source_filename = non_empty_student_files[0].filename
+            student_file_paths = [
+                os.path.join(student_subfolder, unique_filename)
+                for unique_filename in _unique_filenames(non_empty_student_files)
+            ]
+            _map_uploads(lambda pair: _save_fast(*pair), list(zip(non_empty_student_files, student_file_paths)))
             
             if not student_file_paths:
                 return jsonify({'success': False, 'error': f'Tidak ada file valid untuk mahasiswa nomor {student_index + 1}.'}), 400
@@ -785,6 +1067,8 @@ def upload_single():
                 'file_paths': student_file_paths,
                 'is_single_processing': True
             })
+            # NIM and name are filled in by the LLM once scoring runs
+            result_rows.append({'filename': f"Mahasiswa_{student_index + 1}", 'content_hash': None})
         
         # Validate at least one reference is provided
         has_answer_key = answer_key_path is not None
@@ -809,121 +1093,134 @@ def upload_single():
             status='pending',
             job_type='single'
         )
-        db.session.add(job)
-        db.session.commit()
-        
-        # Create job results for each student (NIM and name will be filled by LLM later)
-        for file_info in saved_files:
-            result = JobResult(
-                job_id=job.id,
-                filename=file_info['original_name'],
-                status='pending'
-            )
-            db.session.add(result)
-        db.session.commit()
+        _create_job_with_results(job, result_rows)
         
-        # Log upload
         current_app.logger.info(f'Single Upload: {len(saved_files)} mahasiswa oleh {current_user.username}')
-        SystemLog.log('INFO', 'upload_single', 
-                     f'Upload single processing {len(saved_files)} mahasiswa', 
-                     user_id=current_user.id,
-                     details=json.dumps({'job_id': job.id, 'student_count': len(saved_files)}))
-        
-        # Initialize progress tracking
-        job_progress[job.id] = {
-            'status': 'pending',
-            'message': 'Menunggu proses...',
-            'progress': 0,
-            'total': len(saved_files),
-            'current': 0
-        }
-        
-        # Start scoring process in background
-        scoring_service = ScoringService(current_app._get_current_object())
-        scoring_service.start_scoring(job.id, job_folder, saved_files, job_progress)
+
+        # Publish progress before handing off so SSE subscribers never miss the first state.
+        _init_job_progress(job.id, len(saved_files))
+
+        # Audit log and scoring start are finished off the request thread.
+        _dispatch_upload_finalize(
+            current_app._get_current_object(),
+            job.id,
+            job_folder,
+            saved_files,
+            user_id=current_user.id,
+            log_category='upload_single',
+            log_message=f'Upload single processing {len(saved_files)} mahasiswa',
+            log_details={'job_id': job.id, 'student_count': len(saved_files)},
+        )
         
         return jsonify({
             'success': True,
             'job_id': job.id,
             'message': f'Berhasil mengunggah data {len(saved_files)} mahasiswa. Proses penilaian dimulai.'
-        })
+        }), 202
         
     except RequestEntityTooLarge:
-        max_mb = int(current_app.config.get('MAX_FILE_SIZE_MB', 10))
-        return jsonify({
-            'success': False,
-            'error': f'Total ukuran upload melebihi batas maksimum request ({max_mb} MB).'
-        }), 413
+        return _request_too_large_response()
     except Exception as e:
         current_app.logger.error(f'Error single upload: {str(e)}')
         SystemLog.log('ERROR', 'upload_single', f'Error single upload: {str(e)}', user_id=current_user.id)
         return jsonify({'success': False, 'error': f'Terjadi kesalahan: {str(e)}'}), 500
 
 
+def _get_owned_job(job_id: int) -> Job | None:
+    """Return the current user's job by primary key (identity map first), or None."""
+    job = db.session.get(Job, job_id)
+    if job is None or job.user_id != current_user.id:
+        return None
+    return job
+
+
+SSE_KEEPALIVE_INTERVAL_SEC = 15
+SSE_DB_POLL_INTERVAL_SEC = 1  # Only used when the job is not in the in-memory progress store
+SSE_PROGRESS_COLUMNS = (Job.status, Job.status_message, Job.processed_files, Job.total_files)
+SSE_TERMINAL_STATUSES = frozenset({'completed', 'failed', 'error'})
+SSE_JOB_NOT_FOUND_EVENT = b'data: ' + dumps_bytes({'status': 'error', 'message': 'Job tidak ditemukan'}) + b'\n\n'
+
+
 @dashboard_bp.route('/api/progress/<int:job_id>')
 @login_required
 def get_progress(job_id):
     """Get job progress via Server-Sent Events (SSE)."""
-    owned_job = Job.query.filter_by(id=job_id, user_id=current_user.id).first()
-    if not owned_job:
+    if not _get_owned_job(job_id):
         return jsonify({'success': False, 'error': 'Job tidak ditemukan.'}), 404
 
     def generate():
         """Generate SSE events."""
         import time
         
+        last_payload = None
+        last_sent_at = time.monotonic()
+        version = 0
+
         while True:
-            # Get progress from memory or database
-            if job_id in job_progress:
-                progress = job_progress[job_id]
+            # Block until the scoring thread publishes a change (or the wait times out);
+            # the first snapshot is sent without waiting.
+            if last_payload is None:
+                timeout = 0
+            elif version:
+                timeout = SSE_KEEPALIVE_INTERVAL_SEC
             else:
-                # Fallback to database
-                job = Job.query.filter_by(id=job_id, user_id=current_user.id).first()
-                if job:
-                    progress = {
-                        'status': job.status,
-                        'message': job.status_message or 'Memproses...',
-                        'progress': (job.processed_files / job.total_files * 100) if job.total_files > 0 else 0,
-                        'total': job.total_files,
-                        'current': job.processed_files
-                    }
-                else:
-                    progress = {'status': 'error', 'message': 'Job tidak ditemukan'}
+                timeout = SSE_DB_POLL_INTERVAL_SEC
+            version, progress = job_progress.wait_for_update(job_id, since=version, timeout=timeout)
+            if progress is None:
+                # Fallback to database: read only the progress columns, fresh each tick
+                # (an identity-map hit would keep returning the first snapshot)
+                job = db.session.execute(
+                    select(*SSE_PROGRESS_COLUMNS).where(Job.id == job_id, Job.user_id == current_user.id)
+                ).first()
+                if not job:
+                    yield SSE_JOB_NOT_FOUND_EVENT
+                    break
+                progress = {
+                    'status': job.status,
+                    'message': job.status_message or 'Memproses...',
+                    'progress': (job.processed_files / job.total_files * 100) if job.total_files > 0 else 0,
+                    'total': job.total_files,
+                    'current': job.processed_files
+                }
             
-            # Send event
-            data = json.dumps(progress)
-            yield f"data: {data}\n\n"
+            # Send event only when the snapshot changed; otherwise keep the connection alive
+            payload = dumps_bytes(progress)
+            if payload != last_payload:
+                yield b'data: ' + payload + b'\n\n'
+                last_payload = payload
+                last_sent_at = time.monotonic()
+            elif time.monotonic() - last_sent_at >= SSE_KEEPALIVE_INTERVAL_SEC:
+                yield b': ping\n\n'
+                last_sent_at = time.monotonic()
             
             # Check if completed or failed
-            if progress.get('status') in ['completed', 'failed', 'error']:
+            if progress.get('status') in SSE_TERMINAL_STATUSES:
                 break
-            
-            time.sleep(1)  # Poll every second
     
     return Response(stream_with_context(generate()), mimetype='text/event-stream')
 
 
+JOB_STATUS_RESULT_COLUMNS = (
+    JobResult.filename, JobResult.nim, JobResult.student_name, JobResult.score,
+    JobResult.evaluation, JobResult.status, JobResult.error_message,
+)
+JOB_STATUS_RESULT_FIELDS = tuple(column.key for column in JOB_STATUS_RESULT_COLUMNS)
+
+
 @dashboard_bp.route('/api/job/<int:job_id>')
 @login_required
 def get_job_status(job_id):
     """Get job status as JSON."""
-    job = Job.query.filter_by(id=job_id, user_id=current_user.id).first()
+    job = _get_owned_job(job_id)
     
     if not job:
         return jsonify({'success': False, 'error': 'Job tidak ditemukan.'}), 404
     
-    # Get results
-    results = []
-    for result in job.results.all():
-        results.append({
-            'filename': result.filename,
-            'nim': result.nim,
-            'student_name': result.student_name,
-            'score': result.score,
-            'evaluation': result.evaluation,
-            'status': result.status,
-            'error_message': result.error_message
-        })
+    # Get results as plain column tuples (no ORM objects / identity-map tracking)
+    rows = db.session.execute(
+        select(*JOB_STATUS_RESULT_COLUMNS).where(JobResult.job_id == job.id)
+    ).all()
+    results = [dict(zip(JOB_STATUS_RESULT_FIELDS, row)) for row in rows]
     
     return jsonify({
         'success': True,
@@ -941,11 +1238,25 @@ def get_job_status(job_id):
     })
 
 
+CSV_STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _gzip_file_chunks(path: str):
+    """Yield a gzip-compressed file in fixed-size chunks (body is sent chunked)."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    with open(path, 'rb', buffering=CSV_STREAM_CHUNK_SIZE) as f:
+        while chunk := f.read(CSV_STREAM_CHUNK_SIZE):
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+    yield compressor.flush()
+
+
 @dashboard_bp.route('/api/download/<int:job_id>')
 @login_required
 def download_result(job_id):
     """Download result CSV file."""
-    job = Job.query.filter_by(id=job_id, user_id=current_user.id).first()
+    job = _get_owned_job(job_id)
     
     if not job:
         return jsonify({'success': False, 'error': 'Job tidak ditemukan.'}), 404
@@ -959,6 +1270,17 @@ def download_result(job_id):
     # Generate download filename
     timestamp = job.completed_at.strftime('%Y%m%d_%H%M%S') if job.completed_at else datetime.now().strftime('%Y%m%d_%H%M%S')
     download_name = f"{current_user.username}_{timestamp}.csv"
+
+    # CSV results are highly repetitive; stream them gzip-compressed when the client allows it.
+    if 'gzip' in request.accept_encodings:
+        response = Response(
+            stream_with_context(_gzip_file_chunks(job.result_csv_path)),
+            mimetype='text/csv',
+        )
+        response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Content-Disposition'] = f'attachment; filename="{download_name}"'
+        response.vary.add('Accept-Encoding')
+        return response
     
     return send_file(
         job.result_csv_path,
@@ -972,12 +1294,19 @@ def download_result(job_id):
 @login_required
 def list_jobs():
     """List user's jobs."""
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 10, type=int)
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 10, type=int), 1), 100)
     
+    # Fetch one extra row to detect a next page without a separate COUNT(*) query.
     jobs = Job.query.filter_by(user_id=current_user.id)\
+        .options(load_only(Job.id, Job.status, Job.total_files, Job.processed_files,
+                           Job.created_at, Job.completed_at))\
         .order_by(Job.created_at.desc())\
-        .paginate(page=page, per_page=per_page, error_out=False)
+        .offset((page - 1) * per_page)\
+        .limit(per_page + 1)\
+        .all()
+    has_next = len(jobs) > per_page
+    jobs = jobs[:per_page]
     
     return jsonify({
         'success': True,
@@ -988,8 +1317,7 @@ def list_jobs():
             'processed_files': job.processed_files,
             'created_at': job.created_at.isoformat() if job.created_at else None,
             'completed_at': job.completed_at.isoformat() if job.completed_at else None
-        } for job in jobs.items],
-        'total': jobs.total,
-        'pages': jobs.pages,
-        'current_page': jobs.page
+        } for job in jobs],
+        'current_page': page,
+        'has_next': has_next
     })
@@ -3,13 +3,49 @@ Docling PDF parsing service for AutoScoring application.
 """
 
 import gc
+import multiprocessing
 import os
 import logging
 import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from typing import Optional, List
 
+from app.retry import retry_delay
+
 logger = logging.getLogger(__name__)
 
+# Share of GPU memory this process may claim, leaving headroom for the driver/other tenants
+CUDA_MEMORY_FRACTION = 0.9
+
+# Docling is heavy to import; this module itself is only imported lazily (first job or
+# preload), so resolve the Docling symbols once here instead of in every converter build.
+try:
+    from docling.document_converter import DocumentConverter, PdfFormatOption, ImageFormatOption
+    from docling.datamodel.base_models import InputFormat
+    from docling.datamodel.pipeline_options import PdfPipelineOptions
+    _docling_import_error = None
+except ImportError as e:  # pragma: no cover - depends on the deployment
+    _docling_import_error = e
+
+try:
+    from docling.datamodel.pipeline_options import EasyOcrOptions
+except ImportError:  # pragma: no cover - EasyOCR support is optional
+    EasyOcrOptions = None
+
+try:
+    from docling.datamodel.accelerator_options import AcceleratorDevice, AcceleratorOptions
+except ImportError:  # pragma: no cover - older Docling versions
+    AcceleratorDevice = AcceleratorOptions = None
+
+# pypdfium2 is not thread-safe. Docling's PDF backends hold this lock around every pdfium
+# call, so the text-layer probe below shares it instead of racing a running conversion.
+try:
+    from docling.utils.locks import pypdfium2_lock as _pdfium_lock
+except ImportError:  # pragma: no cover - depends on the deployment
+    _pdfium_lock = threading.Lock()
+
 BASE64_IMAGE_PATTERN = re.compile(
     r'data:image/[^;]+;base64,[A-Za-z0-9+/=_\s-]+',
     re.IGNORECASE,
@@ -21,55 +57,113 @@ IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.heic', '
 DOCUMENT_EXTENSIONS = {'.pdf', '.doc', '.docx'}
 TEXT_EXTENSIONS = {'.txt', '.md', '.markdown'}
 
+# Extension -> file type, resolved with one dict lookup
+_EXT_TO_TYPE = {
+    '.pdf': 'pdf',
+    '.doc': 'docx',
+    '.docx': 'docx',
+    **{ext: 'image' for ext in IMAGE_EXTENSIONS},
+    **{ext: 'text' for ext in TEXT_EXTENSIONS},
+}
+
+# Documents larger than this are refused before any model is loaded
+MAX_DOCUMENT_BYTES = 200 * 1024 * 1024
+
+# Born-digital PDFs skip OCR only when every page has at least this much extractable text
+TEXT_LAYER_MIN_CHARS_PER_PAGE = 200
+
+class DocumentRejected(ValueError):
+    """A file failed preflight; deterministic, so it is never retried."""
+
+
+# Docling ConversionStatus values that carry no usable document
+CONVERSION_FAILED_STATUSES = {'failure', 'skipped'}
+
+# DocumentConverter loads layout and OCR models (GBs); build one per option set per
+# process and share it across DoclingService instances (one is created per job).
+_shared_converters = {}
+_shared_converters_lock = threading.Lock()
+
+# Optional CPU worker processes for multi-document batches (DOCLING_MAX_PROCESSES > 1).
+# Each worker builds its own converter once in the pool initializer.
+_process_pools = {}
+_process_pools_lock = threading.Lock()
+_worker_service = None
+
 
 class DoclingService:
     """Service for parsing PDFs, DOCX, and images using Docling with optional OCR support."""
     
-    def __init__(self, enable_ocr: bool = True, use_gpu: bool = True):
+    def __init__(self, enable_ocr: bool = True, use_gpu: bool = True, max_processes: int = 1):
         """
         Initialize Docling service.
         
         Args:
             enable_ocr: Whether to enable OCR for scanned documents
             use_gpu: Whether to use GPU acceleration if available
+            max_processes: Worker processes for multi-document batches on CPU (1 = in-process)
         """
         self.enable_ocr = enable_ocr
         self.use_gpu = use_gpu
-        self._converter = None
-        self._initialized = False
+        self.max_processes = max(1, int(max_processes or 1))
+    
+    @property
+    def _converter(self):
+        """
+        The process-wide DocumentConverter for this service's options, built on first use.
+        
+        Resolved from the shared cache on every access (never held by the instance),
+        so clear_cache() also releases converters of long-lived services.
+        """
+        key = (self.enable_ocr, self.use_gpu)
+        converter = _shared_converters.get(key)
+        if converter is None:
+            with _shared_converters_lock:
+                converter = _shared_converters.get(key)
+                if converter is None:
+                    converter = self._build_converter()
+                    _shared_converters[key] = converter
+        return converter
+    
+    @property
+    def _initialized(self) -> bool:
+        return (self.enable_ocr, self.use_gpu) in _shared_converters
     
     def _initialize_converter(self):
-        """Lazy initialization of DocumentConverter."""
-        if self._initialized:
-            return
+        """Build the shared DocumentConverter now instead of on the first document."""
+        return self._converter
+    
+    def _build_converter(self):
+        """Build a DocumentConverter for this service's OCR/GPU options."""
+        if _docling_import_error is not None:
+            logger.error(f"Gagal mengimpor Docling: {_docling_import_error}")
+            raise RuntimeError(f"Docling tidak terinstall dengan benar: {_docling_import_error}")
         
         try:
-            from docling.document_converter import DocumentConverter, PdfFormatOption, ImageFormatOption
-            from docling.datamodel.base_models import InputFormat
-            from docling.datamodel.pipeline_options import PdfPipelineOptions
-            
             # Configure pipeline options for PDF
             pipeline_options = PdfPipelineOptions()
             pipeline_options.do_ocr = self.enable_ocr
             
             # Configure OCR if enabled
             if self.enable_ocr:
-                try:
-                    from docling.datamodel.pipeline_options import EasyOcrOptions
-                    pipeline_options.ocr_options = EasyOcrOptions(lang=['id', 'en'])
+                if EasyOcrOptions is not None:
+                    # None lets EasyOCR auto-detect CUDA; pin CPU-only services to the CPU
+                    pipeline_options.ocr_options = EasyOcrOptions(
+                        lang=['id', 'en'],
+                        use_gpu=None if self.use_gpu else False,
+                    )
                     logger.info("EasyOCR diaktifkan dengan bahasa: Indonesia, English")
-                except ImportError:
+                else:
                     logger.warning("EasyOCR tidak tersedia, melanjutkan tanpa OCR")
                     pipeline_options.do_ocr = False
             
             # Configure GPU acceleration
-            if self.use_gpu:
+            if self.use_gpu and AcceleratorOptions is not None:
                 try:
-                    from docling.datamodel.accelerator_options import AcceleratorDevice, AcceleratorOptions
-                    
                     # Check if CUDA is available
                     import torch
                     if torch.cuda.is_available():
+                        torch.cuda.set_per_process_memory_fraction(CUDA_MEMORY_FRACTION)
                         accelerator_options = AcceleratorOptions(
                             device=AcceleratorDevice.CUDA
                         )
@@ -104,30 +198,49 @@ class DoclingService:
                 logger.warning(f"Image format support tidak tersedia: {e}")
             
             # Create converter
-            self._converter = DocumentConverter(format_options=format_options)
-            self._initialized = True
+            converter = DocumentConverter(format_options=format_options)
             logger.info("Docling DocumentConverter berhasil diinisialisasi")
+            return converter
             
-        except ImportError as e:
-            logger.error(f"Gagal mengimpor Docling: {e}")
-            raise RuntimeError(f"Docling tidak terinstall dengan benar: {e}")
         except Exception as e:
             logger.error(f"Gagal menginisialisasi Docling: {e}")
             raise RuntimeError(f"Gagal menginisialisasi Docling: {e}")
     
+    def _preflight(self, file_path: str, file_type: str):
+        """Refuse files Docling cannot use before any converter is loaded."""
+        name = os.path.basename(file_path)
+        if file_type == 'unknown':
+            raise DocumentRejected(f"Format file tidak didukung: {name}")
+        
+        try:
+            size = os.path.getsize(file_path)
+        except OSError as e:
+            raise DocumentRejected(f"File tidak dapat dibaca: {name} ({e})")
+        if size == 0:
+            raise DocumentRejected(f"File kosong: {name}")
+        if size > MAX_DOCUMENT_BYTES:
+            raise DocumentRejected(
+                f"File terlalu besar untuk diproses ({size / (1024 * 1024):.1f} MB): {name}"
+            )
+        
+        if file_type == 'pdf':
+            with open(file_path, 'rb') as f:
+                if f.read(5) != b'%PDF-':
+                    raise DocumentRejected(f"File bukan PDF yang valid: {name}")
+    
+    def _converter_for(self, file_path: str):
+        """Return the converter for a file, skipping OCR for PDFs that already carry text."""
+        if not (self.enable_ocr and self._get_file_type(file_path) == 'pdf'):
+            return self._converter
+        if not _pdf_has_text_layer(file_path):
+            return self._converter
+        
+        logger.info(f"PDF memiliki text layer, OCR dilewati: {file_path}")
+        return DoclingService(enable_ocr=False, use_gpu=self.use_gpu)._converter
+    
     def _get_file_type(self, file_path: str) -> str:
         """Determine file type based on extension."""
-        ext = os.path.splitext(file_path)[1].lower()
-        if ext == '.pdf':
-            return 'pdf'
-        elif ext in {'.doc', '.docx'}:
-            return 'docx'
-        elif ext in IMAGE_EXTENSIONS:
-            return 'image'
-        elif ext in TEXT_EXTENSIONS:
-            return 'text'
-        else:
-            return 'unknown'
+        return _EXT_TO_TYPE.get(os.path.splitext(file_path)[1].lower(), 'unknown')
     
     def parse_pdf(self, pdf_path: str) -> Optional[str]:
         """
@@ -176,6 +289,7 @@ class DoclingService:
             Exception: If parsing fails for any reason
         """
         file_type = self._get_file_type(file_path)
+        self._preflight(file_path, file_type)
         logger.info(f"Memproses dokumen ({file_type}): {file_path}")
 
         if file_type == 'image':
@@ -186,38 +300,127 @@ class DoclingService:
         
         # Plain text files can be read directly
         if file_type == 'text':
+            # One binary read; decode in C and fall back to latin-1 without re-reading the file
+            with open(file_path, 'rb') as f:
+                raw = f.read()
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
+                content = raw.decode('utf-8')
                 logger.info(f"File teks berhasil dibaca: {file_path} ({len(content)} karakter)")
-                return content
             except UnicodeDecodeError:
-                # Try with latin-1 encoding as fallback
-                with open(file_path, 'r', encoding='latin-1') as f:
-                    content = f.read()
+                content = raw.decode('latin-1')
                 logger.info(f"File teks berhasil dibaca (latin-1): {file_path} ({len(content)} karakter)")
-                return content
+            # Match text-mode reads: normalize Windows/old-Mac newlines
+            if '\r' in content:
+                content = content.replace('\r\n', '\n').replace('\r', '\n')
+            return content
         
-        # Initialize converter for non-text files
-        self._initialize_converter()
+        # Convert document (OCR only when the PDF has no usable text layer)
+        result = self._converter_for(file_path).convert(file_path)
         
-        # Convert document
-        result = self._converter.convert(file_path)
+        # Memory is released on failure and once per job via close(); cleaning up after
+        # every document would defeat the allocator caches and stall the CUDA stream.
+        return self._export_markdown(result, file_path)
+    
+    def _export_markdown(self, result, file_path: str) -> str:
+        """Export a conversion result to markdown (LLM-ready) without base64 image payloads."""
+        markdown_text = self._scrub_base64(result.document.export_to_markdown())
         
-        # Export to markdown (LLM-ready format)
-        markdown_text = result.document.export_to_markdown()
-
-        # Never return base64 image payloads to downstream LLM scoring.
+        logger.info(f"Dokumen berhasil diproses: {file_path} ({len(markdown_text)} karakter)")
+        return markdown_text
+    
+    def _scrub_base64(self, markdown_text: str) -> str:
+        """Never return base64 image payloads to downstream LLM scoring."""
         if BASE64_IMAGE_PATTERN.search(markdown_text):
             markdown_text = BASE64_IMAGE_PATTERN.sub('[BASE64_IMAGE_REMOVED]', markdown_text)
             logger.warning("Payload base64 gambar terdeteksi dan dibersihkan dari output markdown")
+        return markdown_text
+    
+    def parse_pdfs(self, file_paths: List[str]) -> List[Optional[str]]:
+        """
+        Parse several documents in one Docling batch.
         
-        logger.info(f"Dokumen berhasil diproses: {file_path} ({len(markdown_text)} karakter)")
+        Non-text files go through a single ``convert_all`` call so the models stay
+        warm across documents.
         
-        # Cleanup memory after processing
-        self._cleanup_memory()
+        Args:
+            file_paths: Paths to the document files
+            
+        Returns:
+            Extracted markdown per input path (same order), None for failed files
+        """
+        contents: List[Optional[str]] = [None] * len(file_paths)
+        batch = []
+        for idx, file_path in enumerate(file_paths):
+            file_type = self._get_file_type(file_path)
+            if file_type == 'text':
+                contents[idx] = self.parse_document(file_path)
+                continue
+            # Same checks as single-document parsing, before anything reaches a worker or Docling
+            try:
+                self._preflight(file_path, file_type)
+            except DocumentRejected as e:
+                logger.error(f"Dokumen ditolak sebelum diproses: {e}")
+                continue
+            batch.append(idx)
         
-        return markdown_text
+        if not batch:
+            return contents
+        
+        if self._use_process_pool(len(batch)):
+            pool = _get_process_pool(self.max_processes, self.enable_ocr)
+            batch_paths = [file_paths[idx] for idx in batch]
+            try:
+                for idx, content in zip(batch, pool.map(_parse_in_worker, batch_paths)):
+                    contents[idx] = content
+                return contents
+            except BrokenProcessPool as e:
+                # A dead worker (e.g. OOM-killed) breaks the pool for good; the next batch gets a fresh one
+                logger.error(f"Pool proses Docling rusak, dibuat ulang pada batch berikutnya: {e}")
+                _discard_process_pool(self.max_processes, self.enable_ocr, pool)
+            except Exception as e:
+                logger.error(f"Worker proses Docling gagal, memproses di proses utama: {e}")
+        
+        try:
+            # One convert_all per converter (OCR / text-layer-only)
+            groups = {}
+            for idx in batch:
+                converter = self._converter_for(file_paths[idx])
+                groups.setdefault(id(converter), (converter, []))[1].append(idx)
+            
+            for converter, group in groups.values():
+                batch_paths = [file_paths[idx] for idx in group]
+                results = converter.convert_all(batch_paths, raises_on_error=False)
+                for idx, result in zip(group, results):
+                    status = getattr(result, 'status', None)
+                    status = str(getattr(status, 'value', status or '')).lower()
+                    if status in CONVERSION_FAILED_STATUSES:
+                        logger.error(f"Gagal memproses dokumen {file_paths[idx]}: status {status}")
+                        continue
+                    try:
+                        contents[idx] = self._export_markdown(result, file_paths[idx])
+                    except Exception as e:
+                        logger.error(f"Gagal memproses dokumen {file_paths[idx]}: {e}")
+        except Exception as e:
+            logger.error(f"Batch Docling gagal, memproses dokumen satu per satu: {e}")
+            self._cleanup_memory()
+            for idx in batch:
+                if contents[idx] is None:
+                    contents[idx] = self.parse_document(file_paths[idx])
+        
+        return contents
+    
+    def _use_process_pool(self, batch_size: int) -> bool:
+        """Worker processes only pay off for several documents, and never on CUDA (one GPU context per process)."""
+        if self.max_processes < 2 or batch_size < 2:
+            return False
+        if self.use_gpu:
+            try:
+                import torch
+                if torch.cuda.is_available():
+                    return False
+            except ImportError:
+                pass
+        return True
     
     def parse_image(self, image_path: str) -> Optional[str]:
         """
@@ -246,10 +449,8 @@ class DoclingService:
         
         combined_content = []
         
-        for idx, file_path in enumerate(file_paths, 1):
-            logger.info(f"Memproses dokumen {idx}/{len(file_paths)}: {os.path.basename(file_path)}")
-            
-            content = self.parse_document(file_path)
+        logger.info(f"Memproses {len(file_paths)} dokumen dalam satu batch")
+        for file_path, content in zip(file_paths, self.parse_pdfs(file_paths)):
             if content:
                 # Add file separator for multiple documents
                 file_name = os.path.basename(file_path)
@@ -275,13 +476,15 @@ class DoclingService:
         """
         return self.parse_document_with_retry(pdf_path, max_retries)
     
-    def parse_document_with_retry(self, file_path: str, max_retries: int = 3) -> Optional[str]:
+    def parse_document_with_retry(self, file_path: str, max_retries: int = 3,
+                                  deadline: Optional[float] = None) -> Optional[str]:
         """
-        Parse document with retry logic and exponential backoff.
+        Parse document with retry logic and jittered exponential backoff.
         
         Args:
             file_path: Path to the document file
             max_retries: Maximum number of retry attempts
+            deadline: Optional ``time.monotonic()`` value after which no retry is started
             
         Returns:
             Extracted text or None if all retries failed
@@ -290,26 +493,49 @@ class DoclingService:
         last_error = None
         
         for attempt in range(max_retries):
+            if attempt and deadline is not None and time.monotonic() >= deadline:
+                logger.warning(f"Batas waktu retry tercapai untuk {file_path}")
+                break
             try:
                 # Use internal method that raises exceptions
                 result = self._parse_document_internal(file_path)
                 return result
-                    
+            
+            except DocumentRejected as e:
+                # Preflight failures are deterministic; retrying them only burns backoff time
+                logger.error(f"Dokumen ditolak sebelum diproses: {e}")
+                return None
             except Exception as e:
                 last_error = e
                 logger.warning(f"Percobaan {attempt + 1}/{max_retries} gagal untuk {file_path}: {e}")
                 self._cleanup_memory()
                 
-                # Exponential backoff: 1s, 2s, 4s...
+                # Jittered exponential backoff so parallel workers do not retry in lockstep
                 if attempt < max_retries - 1:
-                    wait_time = 2 ** attempt
-                    logger.info(f"Menunggu {wait_time}s sebelum retry...")
+                    wait_time = retry_delay(attempt)
+                    if deadline is not None:
+                        wait_time = min(wait_time, max(0.0, deadline - time.monotonic()))
+                    logger.info(f"Menunggu {wait_time:.1f}s sebelum retry...")
                     time.sleep(wait_time)
         
         logger.error(f"Semua percobaan gagal untuk {file_path}. Error terakhir: {last_error}")
         return None
     
-    def _cleanup_memory(self):
+    def close(self):
+        """Release memory held after a batch of documents; call once when a job finishes."""
+        self._cleanup_memory()
+    
+    @classmethod
+    def clear_cache(cls):
+        """Drop the shared converters (e.g. after an OOM) so the next job rebuilds them."""
+        with _shared_converters_lock:
+            dropped = len(_shared_converters)
+            _shared_converters.clear()
+        cls._cleanup_memory()
+        logger.info(f"{dropped} Docling converter bersama dilepas dari cache")
+    
+    @staticmethod
+    def _cleanup_memory():
         """Clean up memory after processing."""
         gc.collect()
         
@@ -341,3 +567,88 @@ class DoclingService:
             pass
         
         return status
+
+
+def _pdf_has_text_layer(pdf_path: str) -> bool:
+    """
+    True only when every page has a native text layer (pypdfium2, a Docling dependency).
+    
+    Reports often mix typed pages with scanned or photographed ones; a single page
+    without text needs OCR, so the whole document keeps it. False when unsure.
+    """
+    try:
+        import pypdfium2
+    except ImportError:
+        return False
+    
+    try:
+        with _pdfium_lock:
+            pdf = pypdfium2.PdfDocument(pdf_path)
+            try:
+                page_count = len(pdf)
+                if page_count == 0:
+                    return False
+                for page_index in range(page_count):
+                    page = pdf[page_index]
+                    textpage = page.get_textpage()
+                    try:
+                        page_chars = len(textpage.get_text_range().strip())
+                    finally:
+                        textpage.close()
+                        page.close()
+                    if page_chars < TEXT_LAYER_MIN_CHARS_PER_PAGE:
+                        return False
+                return True
+            finally:
+                pdf.close()
+    except Exception as e:
+        logger.debug(f"Text layer PDF tidak dapat dibaca ({pdf_path}): {e}")
+        return False
+
+
+def preload_converter(enable_ocr: bool = True, use_gpu: bool = True):
+    """Build the shared DocumentConverter ahead of the first job (worker warm start)."""
+    DoclingService(enable_ocr=enable_ocr, use_gpu=use_gpu)._initialize_converter()
+
+
+def _init_worker(enable_ocr: bool):
+    """Process pool initializer: build one CPU converter per worker process."""
+    global _worker_service
+    # Workers never use CUDA; hide the devices before torch loads so no CUDA context
+    # (hundreds of MB per process) is created.
+    os.environ['CUDA_VISIBLE_DEVICES'] = ''
+    _worker_service = DoclingService(enable_ocr=enable_ocr, use_gpu=False)
+    _worker_service._initialize_converter()
+
+
+def _parse_in_worker(file_path: str) -> Optional[str]:
+    """Parse one document inside a worker process."""
+    return _worker_service.parse_document(file_path)
+
+
+def _get_process_pool(max_processes: int, enable_ocr: bool) -> ProcessPoolExecutor:
+    """Return the process-wide Docling worker pool, created on first use."""
+    key = (max_processes, enable_ocr)
+    with _process_pools_lock:
+        pool = _process_pools.get(key)
+        if pool is None:
+            # spawn, not fork: the parent has live scoring, logging and torch threads whose
+            # held locks would be inherited by the children
+            pool = ProcessPoolExecutor(
+                max_workers=max_processes,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(enable_ocr,),
+            )
+            _process_pools[key] = pool
+            logger.info(f"Pool {max_processes} proses Docling dibuat")
+        return pool
+
+
+def _discard_process_pool(max_processes: int, enable_ocr: bool, pool: ProcessPoolExecutor):
+    """Forget a broken worker pool and shut it down without waiting on its dead workers."""
+    key = (max_processes, enable_ocr)
+    with _process_pools_lock:
+        if _process_pools.get(key) is pool:
+            del _process_pools[key]
+    pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,202 @@
+"""
+LLM response cache for AutoScoring application.
+Exact-match cache of parsed scoring results, shared by every LLMService in the process.
+"""
+
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+from cachetools import TTLCache
+
+from app.json_provider import dumps_bytes, loads
+
+try:
+    import redis
+except ImportError:  # optional: only needed for LLM_CACHE_REDIS_URL
+    redis = None
+
+try:
+    import faiss
+    import numpy as np
+except ImportError:  # optional: only needed for SEMANTIC_CACHE_ENABLED
+    faiss = None
+    np = None
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:  # optional: only needed for SEMANTIC_CACHE_ENABLED
+    SentenceTransformer = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL_SECONDS = 3600
+DEFAULT_SEMANTIC_MODEL = 'sentence-transformers/all-MiniLM-L6-v2'
+DEFAULT_SEMANTIC_THRESHOLD = 0.92
+DEFAULT_SEMANTIC_PARTITIONS = 64
+# MiniLM truncates input at 256 word pieces; ~120 words per chunk stays under that
+SEMANTIC_CHUNK_WORDS = 120
+
+
+def make_cache_key(provider: str, model: str, system_prompt: str, user_prompt: str, **params: Any) -> str:
+    """SHA-256 over everything that determines the model output.
+
+    Score range, evaluation length and grader notes are already part of the
+    system prompt; sampling parameters (temperature, ...) go in ``params``.
+    """
+    digest = hashlib.sha256()
+    for part in (provider, model, repr(sorted(params.items())), system_prompt, user_prompt):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+
+class LLMResponseCache:
+    """Thread-safe in-memory LRU of scoring results with a per-entry age limit."""
+
+    def __init__(self, maxsize: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL_SECONDS):
+        self._data = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            result = self._data.get(key)
+        # Callers post-process results in place; never hand out the cached dict
+        return dict(result) if result is not None else None
+
+    def set(self, key: str, result: Dict[str, Any]):
+        with self._lock:
+            self._data[key] = dict(result)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class RedisLLMResponseCache:
+    """LLMResponseCache backed by Redis, shared across gunicorn workers and hosts."""
+
+    KEY_PREFIX = 'autoscore:llm:'
+
+    def __init__(self, client, ttl: float = DEFAULT_TTL_SECONDS):
+        self._client = client
+        self._ttl = int(ttl)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            raw = self._client.get(self.KEY_PREFIX + key)
+        except Exception as e:
+            logger.warning(f"Cache LLM Redis tidak dapat dibaca: {e}")
+            return None
+        return loads(raw) if raw is not None else None
+
+    def set(self, key: str, result: Dict[str, Any]):
+        try:
+            self._client.set(self.KEY_PREFIX + key, dumps_bytes(result), ex=self._ttl)
+        except Exception as e:
+            logger.warning(f"Cache LLM Redis tidak dapat ditulis: {e}")
+
+    def clear(self):
+        for key in self._client.scan_iter(match=f'{self.KEY_PREFIX}*'):
+            self._client.delete(key)
+
+
+def create_llm_cache(redis_url: Optional[str] = None, maxsize: int = DEFAULT_MAX_ENTRIES,
+                     ttl: float = DEFAULT_TTL_SECONDS):
+    """Return a Redis-backed cache when ``redis_url`` is set and usable, else the in-memory one."""
+    if redis_url:
+        if redis is None:
+            logger.warning("LLM_CACHE_REDIS_URL diset tetapi paket redis tidak terinstall, memakai cache in-memory")
+        else:
+            return RedisLLMResponseCache(redis.Redis.from_url(redis_url), ttl=ttl)
+    return LLMResponseCache(maxsize=maxsize, ttl=ttl)
+
+
+class SemanticLLMCache:
+    """Nearest-neighbour cache of scoring results for near-duplicate student reports.
+
+    Entries are partitioned by ``context_key`` (provider, model, system prompt,
+    question and answer key), so a result is only reused under the exact same
+    rubric. Partitions are bounded and expire like the exact-match cache.
+    Within a partition, reports are compared by cosine similarity of their
+    embeddings (see ``embed``).
+    """
+
+    def __init__(self, model_name: str = DEFAULT_SEMANTIC_MODEL,
+                 threshold: float = DEFAULT_SEMANTIC_THRESHOLD,
+                 max_entries: int = DEFAULT_MAX_ENTRIES,
+                 max_partitions: int = DEFAULT_SEMANTIC_PARTITIONS,
+                 ttl: float = DEFAULT_TTL_SECONDS):
+        self.model_name = model_name
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._model = None
+        self._partitions = TTLCache(maxsize=max_partitions, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def embed(self, text: str):
+        """L2-normalized embedding of the whole report.
+
+        The text is embedded in SEMANTIC_CHUNK_WORDS-word chunks (the model would
+        otherwise only see the first 256 tokens, i.e. the shared cover/template)
+        and the chunk vectors are averaged, so the answers themselves are compared.
+        """
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = SentenceTransformer(self.model_name)
+        words = text.split()
+        chunks = [
+            ' '.join(words[start:start + SEMANTIC_CHUNK_WORDS])
+            for start in range(0, len(words), SEMANTIC_CHUNK_WORDS)
+        ] or ['']
+        vectors = np.asarray(self._model.encode(chunks, normalize_embeddings=True), dtype='float32')
+        vector = vectors.mean(axis=0, keepdims=True)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, context_key: str, vector) -> Optional[Dict[str, Any]]:
+        """Cached result for the nearest report at or above the threshold; ``vector`` comes from embed()."""
+        with self._lock:
+            partition = self._partitions.get(context_key)
+            if partition is None:
+                return None
+            index, results = partition
+            if index.ntotal == 0:
+                return None
+            similarity, position = index.search(vector, 1)
+            if similarity[0][0] < self.threshold:
+                return None
+            return dict(results[position[0][0]])
+
+    def set(self, context_key: str, vector, result: Dict[str, Any]):
+        with self._lock:
+            partition = self._partitions.get(context_key)
+            if partition is None:
+                partition = (faiss.IndexFlatIP(vector.shape[1]), [])
+                self._partitions[context_key] = partition
+            index, results = partition
+            if index.ntotal >= self.max_entries:
+                return
+            index.add(vector)
+            results.append(dict(result))
+
+    def clear(self):
+        with self._lock:
+            self._partitions.clear()
+
+
+def create_semantic_cache(model_name: str = DEFAULT_SEMANTIC_MODEL,
+                          threshold: float = DEFAULT_SEMANTIC_THRESHOLD,
+                          max_entries: int = DEFAULT_MAX_ENTRIES,
+                          ttl: float = DEFAULT_TTL_SECONDS) -> Optional[SemanticLLMCache]:
+    """Return a SemanticLLMCache, or None when faiss/sentence-transformers are not installed."""
+    if faiss is None or SentenceTransformer is None:
+        logger.warning(
+            "SEMANTIC_CACHE_ENABLED diset tetapi paket faiss-cpu/sentence-transformers tidak terinstall, "
+            "cache semantik dinonaktifkan"
+        )
+        return None
+    return SemanticLLMCache(model_name=model_name, threshold=threshold, max_entries=max_entries, ttl=ttl)
@@ -0,0 +1,75 @@
+"""
+Background writer for SystemLog entries in AutoScoring application.
+Audit log entries are queued by SystemLog.log and inserted in batches.
+"""
+
+import atexit
+import logging
+import queue
+import threading
+from typing import Dict, List
+
+from sqlalchemy import insert
+
+from app.extensions import db
+from app.models import SystemLog
+
+logger = logging.getLogger(__name__)
+
+LOG_BATCH_SIZE = 100
+LOG_FLUSH_INTERVAL_SEC = 0.1
+
+
+class SystemLogWriter:
+    """Drain queued SystemLog rows and insert them with one executemany per batch."""
+
+    def __init__(self, app, batch_size: int = LOG_BATCH_SIZE, flush_interval: float = LOG_FLUSH_INTERVAL_SEC):
+        self.app = app
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._write_lock = threading.Lock()
+        self._thread = None
+
+    def start(self) -> 'SystemLogWriter':
+        """Start the daemon writer thread; pending rows are flushed at interpreter exit."""
+        self._thread = threading.Thread(target=self._run, daemon=True, name='SystemLogWriter')
+        self._thread.start()
+        atexit.register(self.flush)
+        return self
+
+    def submit(self, row: Dict):
+        self._queue.put(row)
+
+    def flush(self):
+        """Write everything queued so far on the calling thread."""
+        while True:
+            batch = self._drain(block=False)
+            if not batch:
+                return
+            self._write(batch)
+
+    def _drain(self, block: bool) -> List[Dict]:
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=self.flush_interval) if block else self._queue.get_nowait())
+            while len(batch) < self.batch_size:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _write(self, batch: List[Dict]):
+        with self._write_lock, self.app.app_context():
+            try:
+                db.session.execute(insert(SystemLog), batch)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Gagal menyimpan {len(batch)} log sistem: {e}")
+
+    def _run(self):
+        while True:
+            batch = self._drain(block=True)
+            if batch:
+                self._write(batch)
@@ -0,0 +1,204 @@
+"""
+Job progress store for AutoScoring application.
+Bounded, thread-safe in-memory store shared by scoring threads and SSE streams.
+"""
+
+import itertools
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from cachetools import TTLCache
+
+from app.json_provider import dumps_bytes, loads
+
+try:
+    import redis
+except ImportError:  # optional: only needed for PROGRESS_REDIS_URL
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_JOBS = 10000
+DEFAULT_TTL_SECONDS = 24 * 3600
+
+
+class ProgressStore:
+    """Mapping of job id to progress dict with size and age limits.
+
+    Entries expire after ``ttl`` seconds and the least recently used entries are
+    evicted beyond ``maxsize``; readers then fall back to the job row in the
+    database. Every write bumps a version number and wakes threads blocked in
+    ``wait_for_update``, so SSE streams push changes instead of polling.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_MAX_JOBS, ttl: float = DEFAULT_TTL_SECONDS):
+        self._data = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._versions = itertools.count(1)
+
+    def __setitem__(self, job_id: int, progress: Dict[str, Any]):
+        with self._changed:
+            self._data[job_id] = (next(self._versions), progress)
+            self._changed.notify_all()
+
+    def __getitem__(self, job_id: int) -> Dict[str, Any]:
+        with self._lock:
+            return self._data[job_id][1]
+
+    def __contains__(self, job_id: int) -> bool:
+        with self._lock:
+            return job_id in self._data
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def get(self, job_id: int, default: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._data.get(job_id)
+        return entry[1] if entry is not None else default
+
+    def pop(self, job_id: int, default: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._data.pop(job_id, None)
+        return entry[1] if entry is not None else default
+
+    def wait_for_update(
+        self, job_id: int, since: int = 0, timeout: Optional[float] = None
+    ) -> Tuple[int, Optional[Dict[str, Any]]]:
+        """Block until ``job_id`` has a version newer than ``since`` or ``timeout`` elapses.
+
+        Returns ``(version, progress)`` for the current entry; ``(0, None)`` when
+        the job is not (or no longer) in the store.
+        """
+        def current():
+            entry = self._data.get(job_id)
+            return entry if entry is not None else (0, None)
+
+        with self._changed:
+            self._changed.wait_for(lambda: current()[0] != since, timeout=timeout)
+            return current()
+
+
+class RedisProgressStore:
+    """ProgressStore backed by Redis, so every gunicorn worker/host sees the same progress.
+
+    Each job is one JSON value ``{"v": version, "p": progress}`` with a TTL; writes
+    publish the new version on a per-job channel that ``wait_for_update`` listens to.
+    Redis errors are logged and treated as a missing entry, so readers fall back to
+    the job row in the database and a scoring thread never fails on a progress write.
+    """
+
+    KEY_PREFIX = 'autoscore:progress:'
+
+    def __init__(self, client, ttl: float = DEFAULT_TTL_SECONDS):
+        self._client = client
+        self._ttl = int(ttl)
+        self._version_key = f'{self.KEY_PREFIX}version'
+
+    def _key(self, job_id: int) -> str:
+        return f'{self.KEY_PREFIX}job:{job_id}'
+
+    def _channel(self, job_id: int) -> str:
+        return f'{self.KEY_PREFIX}updates:{job_id}'
+
+    def _read(self, job_id: int) -> Tuple[int, Optional[Dict[str, Any]]]:
+        try:
+            raw = self._client.get(self._key(job_id))
+        except Exception as e:
+            logger.warning(f"Progress Redis tidak dapat dibaca: {e}")
+            return 0, None
+        if raw is None:
+            return 0, None
+        entry = loads(raw)
+        return entry['v'], entry['p']
+
+    def __setitem__(self, job_id: int, progress: Dict[str, Any]):
+        try:
+            version = self._client.incr(self._version_key)
+            pipe = self._client.pipeline()
+            pipe.set(self._key(job_id), dumps_bytes({'v': version, 'p': progress}), ex=self._ttl)
+            pipe.publish(self._channel(job_id), version)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Progress Redis tidak dapat ditulis: {e}")
+
+    def __getitem__(self, job_id: int) -> Dict[str, Any]:
+        progress = self._read(job_id)[1]
+        if progress is None:
+            raise KeyError(job_id)
+        return progress
+
+    def __contains__(self, job_id: int) -> bool:
+        return self._read(job_id)[1] is not None
+
+    def __len__(self) -> int:
+        try:
+            return sum(1 for _ in self._client.scan_iter(match=f'{self.KEY_PREFIX}job:*'))
+        except Exception as e:
+            logger.warning(f"Progress Redis tidak dapat dibaca: {e}")
+            return 0
+
+    def get(self, job_id: int, default: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        progress = self._read(job_id)[1]
+        return progress if progress is not None else default
+
+    def pop(self, job_id: int, default: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        progress = self.get(job_id, default)
+        try:
+            self._client.delete(self._key(job_id))
+        except Exception as e:
+            logger.warning(f"Progress Redis tidak dapat dihapus: {e}")
+        return progress
+
+    def wait_for_update(
+        self, job_id: int, since: int = 0, timeout: Optional[float] = None
+    ) -> Tuple[int, Optional[Dict[str, Any]]]:
+        """Same contract as ProgressStore.wait_for_update, driven by Redis pub/sub.
+
+        If Redis fails while waiting, the call still lasts about ``timeout`` seconds
+        and returns ``(0, None)``, so SSE loops keep their polling pace on the DB fallback.
+        """
+        version, progress = self._read(job_id)
+        if version != since or timeout == 0:
+            return version, progress
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        pubsub = None
+        try:
+            pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(self._channel(job_id))
+            # Re-read after subscribing so a write in between is not missed
+            version, progress = self._read(job_id)
+            while version == since:
+                remaining = 1.0 if deadline is None else deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                if pubsub.get_message(timeout=remaining) is not None:
+                    version, progress = self._read(job_id)
+            return version, progress
+        except Exception as e:
+            logger.warning(f"Progress Redis tidak dapat dipantau: {e}")
+            remaining = 1.0 if deadline is None else deadline - time.monotonic()
+            if remaining > 0:
+                time.sleep(remaining)
+            return 0, None
+        finally:
+            if pubsub is not None:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+
+
+def create_progress_store(redis_url: Optional[str] = None):
+    """Return a Redis-backed store when ``redis_url`` is set and usable, else the in-memory one."""
+    if redis_url:
+        if redis is None:
+            logger.warning("PROGRESS_REDIS_URL diset tetapi paket redis tidak terinstall, memakai progress in-memory")
+        else:
+            return RedisProgressStore(redis.Redis.from_url(redis_url))
+    return ProgressStore()
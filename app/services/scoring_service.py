@@ -15,6 +15,8 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Dict, List, Any, Optional
 from queue import Queue
 
+from sqlalchemy import case, update
+
 from app.extensions import db
 from app.models import Job, JobResult, SystemLog, utc_now_naive
 
@@ -29,6 +31,28 @@ DOCILING_IMAGE_PLACEHOLDER_PATTERNS = [
 ]
 
 
+DEFAULT_MAX_CONCURRENT_JOBS = 2
+
+# Finished JobResult rows are written in batches: one UPDATE + commit per flush, not per file
+RESULT_FLUSH_BATCH_SIZE = 10
+RESULT_FLUSH_INTERVAL_SEC = 0.5
+
+_job_executor = None
+_job_executor_lock = threading.Lock()
+
+
+def _get_job_executor(max_jobs: int) -> ThreadPoolExecutor:
+    """Return the process-wide executor that runs scoring jobs, created on first use."""
+    global _job_executor
+    with _job_executor_lock:
+        if _job_executor is None:
+            _job_executor = ThreadPoolExecutor(
+                max_workers=max(1, max_jobs),
+                thread_name_prefix='ScoringJob'
+            )
+        return _job_executor
+
+
 class ScoringService:
     """Service for orchestrating the scoring process."""
     
@@ -51,6 +75,10 @@ class ScoringService:
         self.config = app.config
         self.max_workers = app.config.get('MAX_WORKERS', 4)
         self.max_retries = app.config.get('MAX_RETRIES', 3)
+        # LLM calls are network-bound: more files may wait on the provider than are being
+        # parsed. Docling parsing itself stays limited to MAX_WORKERS at a time.
+        self.llm_concurrency = max(self.max_workers, app.config.get('LLM_CONCURRENCY', 8))
+        self._parse_slots = threading.BoundedSemaphore(self.max_workers)
         
         # Initialize services lazily
         self._docling_service = None
@@ -70,7 +98,8 @@ class ScoringService:
                     from app.services.docling_service import DoclingService
                     self._docling_service = DoclingService(
                         enable_ocr=self.config.get('ENABLE_OCR', True),
-                        use_gpu=True  # Auto-detect
+                        use_gpu=True,  # Auto-detect
+                        max_processes=self.config.get('DOCLING_MAX_PROCESSES', 1)
                     )
         return self._docling_service
     
@@ -92,7 +121,10 @@ class ScoringService:
         progress_store: Dict
     ):
         """
-        Start scoring process in background thread.
+        Queue scoring on the shared job executor.
+
+        At most MAX_CONCURRENT_JOBS jobs score at once; later jobs keep their
+        pending progress state until a slot frees up.
         
         Args:
             job_id: Database job ID
@@ -119,14 +151,9 @@ class ScoringService:
             )
             return
 
-        thread = threading.Thread(
-            target=self._run_scoring,
-            args=(job_id, job_folder, saved_files, progress_store),
-            daemon=True,
-            name=f"ScoringThread-Job{job_id}"
-        )
-        thread.start()
-        logger.info(f"[START] Scoring thread dimulai untuk job {job_id} (thread: {thread.name})")
+        executor = _get_job_executor(self.config.get('MAX_CONCURRENT_JOBS', DEFAULT_MAX_CONCURRENT_JOBS))
+        executor.submit(self._run_scoring, job_id, job_folder, saved_files, progress_store)
+        logger.info(f"[START] Scoring job {job_id} masuk antrean eksekusi")
     
     def _run_scoring(
         self,
@@ -228,14 +255,38 @@ class ScoringService:
                 success_count = 0
                 error_count = 0
                 
-                logger.info(f"[PROCESSING] Memulai pemrosesan {total_files} file dengan {self.max_workers} workers...")
+                logger.info(
+                    f"[PROCESSING] Memulai pemrosesan {total_files} file "
+                    f"({self.max_workers} parsing, {self.llm_concurrency} request LLM bersamaan)..."
+                )
                 
+                # Byte-identical submissions (same content hash) are scored once and share the result.
+                unique_files = []
+                duplicates_by_primary = {}
+                primary_by_hash = {}
+                for file_info in saved_files:
+                    content_hash = file_info.get('content_hash')
+                    primary = primary_by_hash.get(content_hash) if content_hash else None
+                    if primary is None:
+                        if content_hash:
+                            primary_by_hash[content_hash] = file_info
+                        unique_files.append(file_info)
+                    else:
+                        duplicates_by_primary.setdefault(id(primary), []).append(file_info)
+                        logger.info(
+                            f"[DUPLICATE] {file_info['original_name']} identik dengan {primary['original_name']}, "
+                            "hasil penilaian akan digunakan ulang"
+                        )
+
+                pending_results = []
+                last_flush = time.monotonic()
+
                 # Process files and collect results
-                with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                with ThreadPoolExecutor(max_workers=self.llm_concurrency) as executor:
                     # Submit all tasks
                     future_to_file = {}
-                    for idx, file_info in enumerate(saved_files, 1):
-                        logger.info(f"[QUEUE] [{idx}/{total_files}] Menjadwalkan: {file_info['original_name']}")
+                    for idx, file_info in enumerate(unique_files, 1):
+                        logger.info(f"[QUEUE] [{idx}/{len(unique_files)}] Menjadwalkan: {file_info['original_name']}")
                         future = executor.submit(
                             self._process_single_file,
                             file_info,
@@ -251,64 +302,60 @@ class ScoringService:
                     # Process results as they complete
                     for future in as_completed(future_to_file):
                         file_info = future_to_file[future]
-                        processed_count += 1
-                        filename = file_info['original_name']
-                        
-                        # Update progress
-                        self._update_progress(
-                            progress_store, job_id,
-                            'scoring_progress',
-                            processed_count, total_files
-                        )
-                        
+
                         try:
                             result = future.result()
-                            result['filename'] = filename
-                            results.append(result)
-                            
-                            # Log result summary
-                            if result.get('error'):
-                                error_count += 1
-                                logger.error(f"[FAIL] [{processed_count}/{total_files}] {filename}: ERROR - {result.get('evaluation', 'Unknown error')}")
-                            else:
-                                success_count += 1
-                                nim = result.get('nim', 'N/A')
-                                name = result.get('student_name', 'N/A')
-                                score = result.get('score', 'N/A')
-                                logger.info(f"[DONE] [{processed_count}/{total_files}] {filename}: NIM={nim}, Nama={name}, Skor={score}")
-                            
-                            # Update JobResult in database (within app context)
-                            self._update_job_result_in_db(
-                                job_id, filename, result
-                            )
-                            
-                            # Update job processed count
-                            job.processed_files = processed_count
-                            db.session.commit()
-                            
                         except Exception as e:
-                            error_count += 1
                             error_msg = str(e)
-                            logger.error(f"[FAIL] [{processed_count}/{total_files}] {filename}: EXCEPTION - {error_msg}")
+                            logger.error(f"[FAIL] {file_info['original_name']}: EXCEPTION - {error_msg}")
                             logger.debug(traceback.format_exc())
-                            
-                            error_result = {
-                                'filename': filename,
+                            result = {
                                 'nim': 'ERROR',
                                 'student_name': 'ERROR',
                                 'score': None,
                                 'evaluation': f'Error: {error_msg}',
                                 'error': True
                             }
-                            results.append(error_result)
-                            
-                            # Update JobResult with error
-                            self._update_job_result_in_db(
-                                job_id, filename, error_result
+
+                        for target_info in [file_info] + duplicates_by_primary.get(id(file_info), []):
+                            processed_count += 1
+                            filename = target_info['original_name']
+                            target_result = dict(result, filename=filename)
+                            results.append(target_result)
+
+                            # Update progress
+                            self._update_progress(
+                                progress_store, job_id,
+                                'scoring_progress',
+                                processed_count, total_files
                             )
-                            
-                            job.processed_files = processed_count
-                            db.session.commit()
+
+                            # Log result summary
+                            if target_result.get('error'):
+                                error_count += 1
+                                logger.error(f"[FAIL] [{processed_count}/{total_files}] {filename}: ERROR - {target_result.get('evaluation', 'Unknown error')}")
+                            else:
+                                success_count += 1
+                                nim = target_result.get('nim', 'N/A')
+                                name = target_result.get('student_name', 'N/A')
+                                score = target_result.get('score', 'N/A')
+                                logger.info(f"[DONE] [{processed_count}/{total_files}] {filename}: NIM={nim}, Nama={name}, Skor={score}")
+
+                            pending_results.append((filename, target_result))
+
+                        if (
+                            len(pending_results) >= RESULT_FLUSH_BATCH_SIZE
+                            or time.monotonic() - last_flush >= RESULT_FLUSH_INTERVAL_SEC
+                        ):
+                            self._flush_job_results(job, pending_results, processed_count)
+                            last_flush = time.monotonic()
+
+                self._flush_job_results(job, pending_results, processed_count)
+                if pending_results:
+                    logger.error(
+                        f"[ERROR] Job {job_id}: {len(pending_results)} JobResult gagal disimpan: "
+                        + ', '.join(name for name, _ in pending_results)
+                    )
                 
                 # Processing summary
                 elapsed_time = time.time() - start_time
@@ -376,6 +423,10 @@ class ScoringService:
                     f'Job {job_id} gagal setelah {elapsed_time:.2f}s: {error_msg}',
                     user_id=job.user_id if job else None
                 )
+            finally:
+                # Release Docling/GPU memory once per job instead of after every document
+                if self._docling_service is not None:
+                    self._docling_service.close()
     
     def _process_single_file(
         self,
@@ -428,7 +479,8 @@ class ScoringService:
                 logger.debug(f"[{thread_name}] [PARSE] Parsing {len(file_paths)} files untuk {filename}")
 
                 # Parse all files and combine content
-                combined_content = self.docling_service.parse_multiple_documents(file_paths)
+                with self._parse_slots:
+                    combined_content = self.docling_service.parse_multiple_documents(file_paths)
 
                 if combined_content:
                     student_content = combined_content
@@ -454,10 +506,11 @@ class ScoringService:
                 filepath = file_info['path']
                 logger.debug(f"[{thread_name}] [PARSE] Parsing PDF: {filename}")
 
-                student_content = self.docling_service.parse_pdf_with_retry(
-                    filepath,
-                    max_retries=self.max_retries
-                )
+                with self._parse_slots:
+                    student_content = self.docling_service.parse_pdf_with_retry(
+                        filepath,
+                        max_retries=self.max_retries
+                    )
 
             parse_time = time.time() - parse_start
 
@@ -549,37 +602,81 @@ class ScoringService:
 
         return 'OCR Berhasil', 'Teks hasil parsing Docling terdeteksi memadai.'
     
-    def _update_job_result_in_db(
+    @staticmethod
+    def _job_result_values(result: Dict[str, Any]) -> Dict[str, Any]:
+        """Column values for a finished JobResult row."""
+        return {
+            'nim': result.get('nim', 'TIDAK_DITEMUKAN'),
+            'student_name': result.get('student_name', 'TIDAK_DITEMUKAN'),
+            'score': result.get('score'),
+            'evaluation': result.get('evaluation', ''),
+            'status': 'error' if result.get('error') else 'completed',
+            'error_message': result.get('evaluation') if result.get('error') else None,
+        }
+
+    def _flush_job_results(
         self,
-        job_id: int,
-        filename: str,
-        result: Dict[str, Any]
+        job: Job,
+        pending_results: List[tuple],
+        processed_count: int
     ):
         """
-        Update JobResult in database.
-        
+        Write buffered (filename, result) pairs with one CASE-based UPDATE and
+        record the processed count, all in a single commit.
+
+        If the batch fails, rows are written one by one; only rows that were
+        committed leave the buffer, the rest are retried on the next flush.
+
         Note: This must be called from within app_context!
         """
+        if not pending_results:
+            return
+        job_id = job.id
+        rows = {name: self._job_result_values(result) for name, result in pending_results}
+        processed_at = utc_now_naive()
+
         try:
-            job_result = JobResult.query.filter_by(
-                job_id=job_id,
-                filename=filename
-            ).first()
-            
-            if job_result:
-                job_result.nim = result.get('nim', 'TIDAK_DITEMUKAN')
-                job_result.student_name = result.get('student_name', 'TIDAK_DITEMUKAN')
-                job_result.score = result.get('score')
-                job_result.evaluation = result.get('evaluation', '')
-                job_result.status = 'error' if result.get('error') else 'completed'
-                job_result.error_message = result.get('evaluation') if result.get('error') else None
-                job_result.processed_at = utc_now_naive()
+            values = {
+                column: case({name: row[column] for name, row in rows.items()}, value=JobResult.filename)
+                for column in next(iter(rows.values()))
+            }
+            db.session.execute(
+                update(JobResult)
+                .where(JobResult.job_id == job_id, JobResult.filename.in_(list(rows)))
+                .values(**values, processed_at=processed_at)
+                .execution_options(synchronize_session=False)
+            )
+            job.processed_files = processed_count
+            db.session.commit()
+            pending_results.clear()
+            logger.debug(f"[OK] {len(rows)} JobResult diperbarui untuk job {job_id}")
+            return
+        except Exception as e:
+            logger.error(f"[ERROR] Failed to update JobResult batch for job {job_id}: {e}")
+            db.session.rollback()
+
+        # Fallback: one commit per row, like the unbatched loop, so one bad row cannot sink the rest
+        failed = []
+        for filename, result in pending_results:
+            try:
+                db.session.execute(
+                    update(JobResult)
+                    .where(JobResult.job_id == job_id, JobResult.filename == filename)
+                    .values(**rows[filename], processed_at=processed_at)
+                    .execution_options(synchronize_session=False)
+                )
                 db.session.commit()
-                logger.debug(f"[OK] JobResult updated: {filename} (status: {job_result.status})")
-            else:
-                logger.warning(f"[WARN] JobResult not found for job {job_id}, file: {filename}")
+            except Exception as e:
+                logger.error(f"[ERROR] Failed to update JobResult: {filename} - {e}")
+                db.session.rollback()
+                failed.append((filename, result))
+        pending_results[:] = failed
+
+        try:
+            job.processed_files = processed_count
+            db.session.commit()
         except Exception as e:
-            logger.error(f"[ERROR] Failed to update JobResult: {filename} - {e}")
+            logger.error(f"[ERROR] Failed to update processed_files for job {job_id}: {e}")
             db.session.rollback()
     
     def _update_progress(
@@ -6,8 +6,11 @@ Lab FKI Universitas Muhammadiyah Surakarta
 import os
 from app import create_app
 
-# Create application instance
-app = create_app()
+# Create application instance. Docling worker processes (DOCLING_MAX_PROCESSES > 1) are
+# spawned and re-import this file as __mp_main__; they only parse documents, so they
+# must not build a second app with its own scheduler, preload and DB startup work.
+if __name__ != '__mp_main__':
+    app = create_app()
 
 if __name__ == '__main__':
     # Get configuration from environment
@@ -0,0 +1,50 @@
+"""
+Unit tests for upload/result cleanup.
+"""
+
+import os
+
+from app.models import SystemLog
+from app.services.cleanup_service import cleanup_temp_files
+
+
+class TestCleanupTempFiles:
+    """Test startup/scheduled upload folder cleanup."""
+
+    def test_removes_job_folders_and_loose_files(self, app):
+        upload_folder = app.config['UPLOAD_FOLDER']
+        for job in ('job-a', 'job-b', 'job-c'):
+            os.makedirs(os.path.join(upload_folder, job, 'students'))
+            with open(os.path.join(upload_folder, job, 'students', 'x.pdf'), 'wb') as f:
+                f.write(b'%PDF-1.4')
+        with open(os.path.join(upload_folder, 'stray.tmp'), 'wb') as f:
+            f.write(b'x')
+
+        cleanup_temp_files(app)
+
+        assert os.listdir(upload_folder) == []
+        with app.app_context():
+            log = SystemLog.query.filter_by(category='cleanup').order_by(SystemLog.id.desc()).first()
+            assert '3 folder, 1 file' in log.message
+
+
+class TestCleanupOldResults:
+    """Test result CSV retention cleanup."""
+
+    def test_removes_only_files_older_than_cutoff(self, app):
+        import time
+        from app.services.cleanup_service import cleanup_old_results
+
+        results_folder = app.config['RESULTS_FOLDER']
+        old_path = os.path.join(results_folder, 'old.csv')
+        new_path = os.path.join(results_folder, 'new.csv')
+        for path in (old_path, new_path):
+            with open(path, 'w') as f:
+                f.write('nim,score\n')
+        forty_days_ago = time.time() - 40 * 24 * 3600
+        os.utime(old_path, (forty_days_ago, forty_days_ago))
+        os.makedirs(os.path.join(results_folder, 'subdir'))
+
+        cleanup_old_results(app, days_old=30)
+
+        assert sorted(os.listdir(results_folder)) == ['new.csv', 'subdir']
@@ -91,7 +91,7 @@ class TestBulkProcessingUpload:
             )
         
         # Should succeed or return job_id
-        if response.status_code == 200:
+        if response.status_code == 202:
             data = json.loads(response.data)
             assert data['success'] == True
             assert 'job_id' in data
@@ -109,7 +109,7 @@ class TestBulkProcessingUpload:
                 content_type='multipart/form-data'
             )
 
-        assert response.status_code == 200
+        assert response.status_code == 202
         data = json.loads(response.data)
         assert data['success'] is True
 
@@ -227,7 +227,7 @@ class TestSingleProcessingUpload:
                 content_type='multipart/form-data'
             )
         
-        if response.status_code == 200:
+        if response.status_code == 202:
             data = json.loads(response.data)
             assert data['success'] == True
             assert 'job_id' in data
@@ -246,7 +246,7 @@ class TestSingleProcessingUpload:
                 content_type='multipart/form-data'
             )
 
-        assert response.status_code == 200
+        assert response.status_code == 202
         data = json.loads(response.data)
         assert data['success'] is True
 
@@ -305,11 +305,72 @@ class TestJobStatusEndpoints:
         response = auth_client.get('/api/job/99999')
         assert response.status_code == 404
     
+    def test_job_status_lists_results(self, auth_client, app):
+        """Job status should include every result row with its public fields."""
+        with app.app_context():
+            from app.extensions import db
+
+            user = User.query.filter_by(username='testuser').first()
+            job = Job(user_id=user.id, status='processing', total_files=2, processed_files=1)
+            db.session.add(job)
+            db.session.flush()
+            db.session.add_all([
+                JobResult(job_id=job.id, filename='a.pdf', nim='123', student_name='Ani',
+                          score=88, evaluation='Baik', status='completed'),
+                JobResult(job_id=job.id, filename='b.pdf', status='pending'),
+            ])
+            db.session.commit()
+            job_id = job.id
+
+        response = auth_client.get(f'/api/job/{job_id}')
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        results = sorted(data['results'], key=lambda r: r['filename'])
+        assert results[0] == {
+            'filename': 'a.pdf', 'nim': '123', 'student_name': 'Ani', 'score': 88,
+            'evaluation': 'Baik', 'status': 'completed', 'error_message': None,
+        }
+        assert results[1]['status'] == 'pending'
+
     def test_download_requires_auth(self, client):
         """Test that download requires authentication."""
         response = client.get('/api/download/1')
         assert response.status_code in [302, 401]
 
+    def test_download_streams_gzip_when_accepted(self, auth_client, app, tmp_path):
+        """Download should stream gzip-compressed CSV when the client accepts gzip."""
+        import gzip
+
+        csv_path = tmp_path / 'result.csv'
+        csv_content = 'filename,nim,score\n' + 'laporan.pdf,123,90\n' * 200
+        csv_path.write_text(csv_content, encoding='utf-8')
+
+        with app.app_context():
+            from app.extensions import db
+
+            user = User.query.filter_by(username='testuser').first()
+            job = Job(
+                user_id=user.id,
+                status='completed',
+                total_files=1,
+                processed_files=1,
+                result_csv_path=str(csv_path),
+            )
+            db.session.add(job)
+            db.session.commit()
+            job_id = job.id
+
+        response = auth_client.get(f'/api/download/{job_id}', headers={'Accept-Encoding': 'gzip'})
+        assert response.status_code == 200
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'attachment' in response.headers['Content-Disposition']
+        assert gzip.decompress(response.data).decode('utf-8') == csv_content
+
+        plain = auth_client.get(f'/api/download/{job_id}')
+        assert plain.status_code == 200
+        assert 'Content-Encoding' not in plain.headers
+        assert plain.data.decode('utf-8') == csv_content
+
     def test_progress_fallback_uses_database_state(self, auth_client, app):
         """Progress endpoint should fall back to DB state when in-memory progress is unavailable."""
         with app.app_context():
@@ -391,6 +452,118 @@ class TestFileValidation:
             # Should not be a "bukan PDF" error for valid PDF
             assert 'bukan' not in data.get('error', '').lower() or 'pdf' not in data.get('error', '').lower()
     
+    def test_pdf_with_invalid_header_is_rejected_and_not_kept(self, auth_client, app):
+        """A file claiming to be PDF without the %PDF- header must be rejected and discarded."""
+        import os
+
+        upload_root = app.config['UPLOAD_FOLDER']
+        before = set(os.listdir(upload_root)) if os.path.isdir(upload_root) else set()
+
+        response = auth_client.post('/api/upload',
+            data={
+                'student_files': (io.BytesIO(b'not a pdf at all'), 'fake.pdf', 'application/pdf'),
+                'score_min': '40',
+                'score_max': '100',
+                'additional_notes': 'Test notes'
+            },
+            content_type='multipart/form-data'
+        )
+
+        assert response.status_code == 400
+        data = json.loads(response.data)
+        assert 'header tidak sesuai' in data['error']
+        after = set(os.listdir(upload_root)) if os.path.isdir(upload_root) else set()
+        assert after == before
+
+    def test_docx_validation_reads_only_zip_directory(self):
+        """Large DOCX bodies must not be read when only the ZIP directory is needed."""
+        import os
+        import zipfile
+        from app.routes.dashboard import is_valid_docx
+
+        class CountingStream(io.BytesIO):
+            bytes_read = 0
+
+            def read(self, size=-1):
+                data = super().read(size)
+                self.bytes_read += len(data)
+                return data
+
+        docx_mime = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as zf:
+            zf.writestr('[Content_Types].xml', f'<Types><Override ContentType="{docx_mime}.main+xml"/></Types>')
+            zf.writestr('word/document.xml', '<w:document/>')
+            zf.writestr('word/media/image1.png', os.urandom(2 * 1024 * 1024))
+        stream = CountingStream(buffer.getvalue())
+
+        assert is_valid_docx(stream) is True
+        assert stream.bytes_read < 64 * 1024
+        assert stream.tell() == 0
+
+    def test_bulk_validation_reports_errors_in_upload_order(self, auth_client):
+        """Concurrent validation must still report every invalid file, in upload order."""
+        pdf_bytes = b'%PDF-1.4\n%%EOF\n'
+        response = auth_client.post('/api/upload',
+            data={
+                'student_files': [
+                    (io.BytesIO(pdf_bytes), 'ok.pdf', 'application/pdf'),
+                    (io.BytesIO(pdf_bytes), 'first_bad.pdf', 'text/plain'),
+                    (io.BytesIO(pdf_bytes), 'second_bad.pdf', 'image/png'),
+                ],
+                'score_min': '40',
+                'score_max': '100',
+                'additional_notes': 'Test notes'
+            },
+            content_type='multipart/form-data'
+        )
+
+        assert response.status_code == 400
+        error = json.loads(response.data)['error']
+        assert 'ok.pdf' not in error
+        assert error.index('first_bad.pdf') < error.index('second_bad.pdf')
+
+    def test_docx_validation_reads_zip_from_stream(self):
+        """DOCX validation should inspect the ZIP in place and leave the stream rewound."""
+        import zipfile
+        from werkzeug.datastructures import FileStorage
+        from app.routes.dashboard import validate_question_doc
+
+        docx_mime = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+        def build_zip(entries):
+            buffer = io.BytesIO()
+            with zipfile.ZipFile(buffer, 'w') as zf:
+                for name, content in entries.items():
+                    zf.writestr(name, content)
+            return buffer.getvalue()
+
+        docx_bytes = build_zip({
+            '[Content_Types].xml': f'<Types><Override ContentType="{docx_mime}.main+xml"/></Types>',
+            'word/document.xml': '<w:document/>',
+        })
+        docx_file = FileStorage(stream=io.BytesIO(docx_bytes), filename='soal.docx', content_type=docx_mime)
+        assert validate_question_doc(docx_file) == []
+        assert docx_file.stream.tell() == 0
+
+        plain_zip = FileStorage(
+            stream=io.BytesIO(build_zip({'readme.txt': 'bukan docx'})),
+            filename='soal.docx',
+            content_type=docx_mime,
+        )
+        errors = validate_question_doc(plain_zip)
+        assert errors and 'signature tidak valid' in errors[0]
+
+    def test_heic_brand_check_only_matches_aligned_brands(self):
+        """HEIC compatible brands count only on 4-byte boundaries after the major brand."""
+        from app.routes.dashboard import is_valid_heic_heif
+
+        assert is_valid_heic_heif(b'\x00\x00\x00\x18ftypheic\x00\x00\x00\x00mif1heic')
+        assert is_valid_heic_heif(b'\x00\x00\x00\x18ftypisom\x00\x00\x00\x00iso2mif1')
+        # 'heic' straddles two MP4 brand slots and must not be accepted
+        assert not is_valid_heic_heif(b'\x00\x00\x00\x18ftypisom\x00\x00\x00\x00xxheicxx')
+        assert not is_valid_heic_heif(b'\x00\x00\x00\x18moovheic\x00\x00\x00\x00mif1heic')
+
     def test_image_validation(self, auth_client, sample_image):
         """Test image file validation for question docs."""
         with open(sample_image, 'rb') as f:
@@ -410,6 +583,52 @@ class TestFileValidation:
             # Should not be a file type error
             assert 'ekstensi' not in data.get('error', '').lower()
 
+    def test_multipart_parser_uses_configured_buffer_size(self, app):
+        """Upload bodies are parsed with UPLOAD_PARSE_BUFFER_SIZE reads and still yield every part."""
+        from flask import request
+
+        app.config['UPLOAD_PARSE_BUFFER_SIZE'] = 4096
+        body = b'%PDF-1.4\n' + b'x' * 20000
+        with app.test_request_context('/api/upload', method='POST', data={
+            'score_min': '40',
+            'student_files': [(io.BytesIO(body), 'a.pdf'), (io.BytesIO(body), 'b.pdf')],
+        }, content_type='multipart/form-data'):
+            assert request.make_form_data_parser().buffer_size == 4096
+            assert request.form['score_min'] == '40'
+            assert [f.read() for f in request.files.getlist('student_files')] == [body, body]
+
+        app.config['UPLOAD_PARSE_BUFFER_SIZE'] = 64 * 1024 * 1024
+        with app.test_request_context('/api/upload', method='POST'):
+            assert request.make_form_data_parser().buffer_size <= request.max_form_memory_size // 2
+
+    def test_oversize_part_is_not_stored_past_limit(self, app):
+        """File parts beyond MAX_FILE_SIZE_MB keep their real size but are not buffered whole."""
+        import os
+        from flask import request
+        from app.routes.dashboard import _file_size_bytes
+
+        app.config['MAX_FILE_SIZE_MB'] = 1
+        body = b'%PDF-1.4\n' + b'x' * (3 * 1024 * 1024)
+        with app.test_request_context('/api/upload', method='POST', data={
+            'student_files': (io.BytesIO(body), 'big.pdf'),
+        }, content_type='multipart/form-data'):
+            upload = request.files['student_files']
+            assert _file_size_bytes(upload) == len(body)
+            upload.stream.seek(0, os.SEEK_END)
+            assert upload.stream.tell() == 1024 * 1024 + 1
+
+    def test_unique_filenames_are_sanitized_and_prefixed(self):
+        """Saved names should keep the sanitized filename behind a distinct random prefix."""
+        from werkzeug.datastructures import FileStorage
+        from app.routes.dashboard import _unique_filenames
+
+        files = [FileStorage(filename='../laporan 1.pdf'), FileStorage(filename='../laporan 1.pdf')]
+        names = _unique_filenames(files)
+
+        assert [name[9:] for name in names] == ['laporan_1.pdf', 'laporan_1.pdf']
+        assert all(len(name.split('_', 1)[0]) == 8 for name in names)
+        assert names[0] != names[1]
+
 
 class TestRuntimeSettingsEnforcement:
     """Test runtime settings persistence and enforcement in upload routes."""
@@ -482,6 +701,28 @@ class TestRuntimeSettingsEnforcement:
         payload = json.loads(response.data)
         assert 'melebihi batas ukuran' in payload['error'].lower()
 
+    def test_upload_rejects_declared_oversize_body_before_parsing(self, auth_client, app):
+        """Requests whose Content-Length exceeds the limit should get a JSON 413 up front."""
+        with app.app_context():
+            LLMConfig.set('runtime_max_pdf_count', '1')
+            LLMConfig.set('runtime_max_file_size_mb', '1')
+
+        # Limit is 1 MB x 1 file + 1 MB multipart overhead
+        oversized_pdf = b'%PDF-1.4\n' + (b'x' * (3 * 1024 * 1024))
+        response = auth_client.post('/api/upload',
+            data={
+                'student_files': (io.BytesIO(oversized_pdf), 'big.pdf', 'application/pdf'),
+                'score_min': '40',
+                'score_max': '100',
+            },
+            content_type='multipart/form-data'
+        )
+
+        assert response.status_code == 413
+        data = json.loads(response.data)
+        assert data['success'] is False
+        assert 'melebihi batas maksimum request' in data['error']
+
     def test_single_upload_uses_runtime_max_pdf_count(self, auth_client, app, sample_image):
         """Single upload must enforce runtime max count using total uploaded answer files."""
         with app.app_context():
@@ -561,3 +802,27 @@ class TestRuntimeSettingsEnforcement:
         assert response.status_code == 400
         payload = json.loads(response.data)
         assert 'batas maksimum (2 file)' in payload['error']
+
+
+class TestJobListing:
+    """Test job listing endpoint."""
+
+    def test_list_jobs_reports_next_page_without_count(self, auth_client, app):
+        """Job listing should page through results and flag when more pages exist."""
+        with app.app_context():
+            from app.extensions import db
+
+            user = User.query.filter_by(username='testuser').first()
+            for _ in range(3):
+                db.session.add(Job(user_id=user.id, status='completed', total_files=1))
+            db.session.commit()
+
+        first_page = json.loads(auth_client.get('/api/jobs?per_page=2').data)
+        assert first_page['success'] is True
+        assert len(first_page['jobs']) == 2
+        assert first_page['has_next'] is True
+
+        second_page = json.loads(auth_client.get('/api/jobs?per_page=2&page=2').data)
+        assert len(second_page['jobs']) == 1
+        assert second_page['has_next'] is False
+        assert second_page['current_page'] == 2
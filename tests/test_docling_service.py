@@ -1,19 +1,21 @@
 """Unit tests for DoclingService behavior independent of Docling runtime."""
 
+import pytest
 from unittest.mock import Mock
 
 from app.services.docling_service import DoclingService
 
 
-def test_parse_image_output_removes_embedded_base64(tmp_path):
+def test_parse_image_output_removes_embedded_base64(tmp_path, monkeypatch):
     """Image parsing output must not include embedded base64 payloads."""
     image_path = tmp_path / 'sample.png'
     image_path.write_bytes(
         b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x02\x00\x00\x00\x90wS\xde\x00\x00\x00\x0cIDATx\x9cc\xf8\x0f\x00\x00\x01\x01\x00\x05\x18\xd8N\x00\x00\x00\x00IEND\xaeB`\x82'
     )
 
+    from app.services import docling_service
+
     service = DoclingService(enable_ocr=True, use_gpu=False)
-    service._initialized = True
 
     mock_document = Mock()
     mock_document.export_to_markdown.return_value = (
@@ -22,7 +24,9 @@ def test_parse_image_output_removes_embedded_base64(tmp_path):
         'Akhir dokumen'
     )
     mock_result = Mock(document=mock_document)
-    service._converter = Mock(convert=Mock(return_value=mock_result))
+    monkeypatch.setattr(docling_service, '_shared_converters', {
+        (True, False): Mock(convert=Mock(return_value=mock_result)),
+    })
 
     output = service.parse_image(str(image_path))
 
@@ -31,3 +35,286 @@ def test_parse_image_output_removes_embedded_base64(tmp_path):
     assert 'data:image/png;base64' not in output
     assert '[BASE64_IMAGE_REMOVED]' in output
     assert 'Akhir dokumen' in output
+
+
+def test_parse_multiple_documents_converts_in_one_batch(tmp_path, monkeypatch):
+    """Non-text documents are converted with a single convert_all call, text files are read directly."""
+    notes_path = tmp_path / 'catatan.txt'
+    notes_path.write_text('Catatan soal', encoding='utf-8')
+    first_path = tmp_path / 'soal1.pdf'
+    second_path = tmp_path / 'soal2.pdf'
+    for path in (first_path, second_path):
+        path.write_bytes(b'%PDF-1.4\n')
+
+    from app.services import docling_service
+
+    service = DoclingService(enable_ocr=False, use_gpu=False)
+
+    ok_result = Mock(document=Mock(export_to_markdown=Mock(return_value='Isi soal 1')))
+    failed_result = Mock(status='failure')
+    converter = Mock(convert_all=Mock(return_value=iter([ok_result, failed_result])))
+    monkeypatch.setattr(docling_service, '_shared_converters', {(False, False): converter})
+
+    output = service.parse_multiple_documents([str(first_path), str(notes_path), str(second_path)])
+
+    converter.convert_all.assert_called_once_with(
+        [str(first_path), str(second_path)], raises_on_error=False
+    )
+    converter.convert.assert_not_called()
+    assert output == (
+        '--- Dokumen: soal1.pdf ---\nIsi soal 1\n\n'
+        '--- Dokumen: catatan.txt ---\nCatatan soal'
+    )
+
+
+def test_converter_is_shared_across_service_instances(monkeypatch):
+    """Each job creates a DoclingService; the heavy converter must be built only once per options."""
+    from app.services import docling_service
+
+    monkeypatch.setattr(docling_service, '_shared_converters', {})
+    build = Mock(side_effect=lambda: object())
+    monkeypatch.setattr(DoclingService, '_build_converter', lambda self: build())
+
+    first = DoclingService(enable_ocr=True, use_gpu=False)
+    second = DoclingService(enable_ocr=True, use_gpu=False)
+    no_ocr = DoclingService(enable_ocr=False, use_gpu=False)
+    for service in (first, second, no_ocr):
+        service._initialize_converter()
+
+    assert first._converter is second._converter
+    assert no_ocr._converter is not first._converter
+    assert build.call_count == 2
+
+
+def test_parse_pdfs_uses_worker_processes_when_enabled(tmp_path, monkeypatch):
+    """With max_processes > 1 on CPU, documents are dispatched to the worker pool in order."""
+    from app.services import docling_service
+
+    paths = [str(tmp_path / 'a.pdf'), str(tmp_path / 'b.pdf')]
+    for path in paths:
+        with open(path, 'wb') as f:
+            f.write(b'%PDF-1.4\n')
+    pool = Mock()
+    pool.map.side_effect = lambda func, batch: [f'isi {path[-5:]}' for path in batch]
+    monkeypatch.setattr(docling_service, '_get_process_pool', lambda max_processes, enable_ocr: pool)
+
+    monkeypatch.setattr(docling_service, '_shared_converters', {})
+
+    service = DoclingService(enable_ocr=False, use_gpu=False, max_processes=2)
+
+    assert service.parse_pdfs(paths) == ['isi a.pdf', 'isi b.pdf']
+    assert service._initialized is False
+
+
+def test_clear_cache_drops_shared_converters(monkeypatch):
+    """clear_cache empties the shared converter cache so the next service rebuilds it."""
+    from app.services import docling_service
+
+    monkeypatch.setattr(docling_service, '_shared_converters', {(False, False): object()})
+
+    service = DoclingService(enable_ocr=False, use_gpu=False)
+    assert service._initialized is True
+
+    DoclingService.clear_cache()
+
+    assert docling_service._shared_converters == {}
+    # Long-lived services hold no converter of their own, so they rebuild after a clear
+    assert service._initialized is False
+
+
+def test_text_documents_fall_back_to_latin1_and_normalize_newlines(tmp_path):
+    """Text files are decoded as UTF-8, then latin-1, with text-mode newline handling."""
+    utf8_path = tmp_path / 'kunci.md'
+    utf8_path.write_bytes('Jawaban benar\r\nNilai ≥ 80'.encode('utf-8'))
+    latin1_path = tmp_path / 'catatan.txt'
+    latin1_path.write_bytes('Caf\xe9\rselesai'.encode('latin-1'))
+
+    service = DoclingService(enable_ocr=False, use_gpu=False)
+
+    assert service.parse_document(str(utf8_path)) == 'Jawaban benar\nNilai ≥ 80'
+    assert service.parse_document(str(latin1_path)) == 'Café\nselesai'
+
+
+def test_text_layer_pdfs_skip_the_ocr_converter(tmp_path, monkeypatch):
+    """PDFs with a native text layer are converted by the OCR-free shared converter."""
+    from app.services import docling_service
+
+    ocr_converter, text_converter = Mock(), Mock()
+    monkeypatch.setattr(docling_service, '_shared_converters', {
+        (True, False): ocr_converter,
+        (False, False): text_converter,
+    })
+    monkeypatch.setattr(docling_service, '_pdf_has_text_layer', lambda path: path.endswith('digital.pdf'))
+
+    service = DoclingService(enable_ocr=True, use_gpu=False)
+
+    assert service._converter_for(str(tmp_path / 'digital.pdf')) is text_converter
+    assert service._converter_for(str(tmp_path / 'scan.pdf')) is ocr_converter
+    assert service._converter_for(str(tmp_path / 'foto.png')) is ocr_converter
+
+
+def test_parse_document_with_retry_stops_at_deadline(tmp_path, monkeypatch):
+    """No new attempt is started once the retry deadline has passed."""
+    import time
+    from app.services import docling_service
+
+    monkeypatch.setattr(time, 'sleep', lambda seconds: None)
+    monkeypatch.setattr(docling_service, 'retry_delay', lambda attempt: 0.0)
+
+    pdf_path = tmp_path / 'a.pdf'
+    pdf_path.write_bytes(b'%PDF-1.4\n')
+
+    service = DoclingService(enable_ocr=False, use_gpu=False)
+    parse = Mock(side_effect=RuntimeError('gagal'))
+    monkeypatch.setattr(service, '_parse_document_internal', parse)
+
+    assert service.parse_document_with_retry(str(pdf_path), max_retries=3,
+                                             deadline=time.monotonic() - 1) is None
+    assert parse.call_count == 1
+
+
+def test_preflight_rejects_unusable_files_without_loading_docling(tmp_path):
+    """Empty, unsupported and fake PDF files fail before the converter is initialized."""
+    empty_pdf = tmp_path / 'kosong.pdf'
+    empty_pdf.write_bytes(b'')
+    fake_pdf = tmp_path / 'palsu.pdf'
+    fake_pdf.write_bytes(b'bukan pdf')
+    unknown = tmp_path / 'data.xyz'
+    unknown.write_bytes(b'isi')
+
+    service = DoclingService(enable_ocr=False, use_gpu=False)
+
+    for path in (empty_pdf, fake_pdf, unknown):
+        assert service.parse_document(str(path)) is None
+    assert service._initialized is False
+
+
+def test_broken_process_pool_is_discarded_and_batch_parsed_in_process(tmp_path, monkeypatch):
+    """A pool broken by a dead worker is shut down and forgotten so the next batch builds a new one."""
+    from concurrent.futures.process import BrokenProcessPool
+    from app.services import docling_service
+
+    paths = [str(tmp_path / 'a.pdf'), str(tmp_path / 'b.pdf')]
+    for path in paths:
+        with open(path, 'wb') as f:
+            f.write(b'%PDF-1.4\n')
+    pool = Mock()
+    pool.map.side_effect = BrokenProcessPool('worker mati')
+    monkeypatch.setattr(docling_service, '_process_pools', {(2, False): pool})
+
+    ok_result = Mock(document=Mock(export_to_markdown=Mock(return_value='isi')))
+    monkeypatch.setattr(docling_service, '_shared_converters', {
+        (False, False): Mock(convert_all=Mock(return_value=[ok_result, ok_result])),
+    })
+
+    service = DoclingService(enable_ocr=False, use_gpu=False, max_processes=2)
+
+    assert service.parse_pdfs(paths) == ['isi', 'isi']
+    assert docling_service._process_pools == {}
+    pool.shutdown.assert_called_once_with(wait=False, cancel_futures=True)
+
+
+def _write_pdf(path, page_texts):
+    """Write a minimal PDF; pages with text get a Helvetica text layer, None pages have none (like scans)."""
+    objects = ['<< /Type /Catalog /Pages 2 0 R >>', None,
+               '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    kids = []
+    for text in page_texts:
+        stream = f'BT /F1 8 Tf 20 700 Td ({text}) Tj ET' if text else ''
+        objects.append(f'<< /Length {len(stream)} >>\nstream\n{stream}\nendstream')
+        objects.append(
+            '<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+            f'/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>'
+        )
+        kids.append(f'{len(objects)} 0 R')
+    objects[1] = f'<< /Type /Pages /Kids [{" ".join(kids)}] /Count {len(kids)} >>'
+
+    body = b'%PDF-1.4\n'
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(body))
+        body += f'{number} 0 obj\n{obj}\nendobj\n'.encode('latin-1')
+    xref = len(body)
+    body += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode('latin-1')
+    body += b''.join(f'{offset:010d} 00000 n \n'.encode('latin-1') for offset in offsets)
+    body += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode('latin-1')
+    path.write_bytes(body)
+
+
+def test_text_layer_requires_every_page_to_carry_text(tmp_path):
+    """A typed page followed by scanned pages must still go through OCR."""
+    pytest.importorskip('pypdfium2')
+    from app.services.docling_service import TEXT_LAYER_MIN_CHARS_PER_PAGE, _pdf_has_text_layer
+
+    typed = 'x' * (TEXT_LAYER_MIN_CHARS_PER_PAGE * 4)
+    all_typed = tmp_path / 'digital.pdf'
+    _write_pdf(all_typed, [typed, typed])
+    mixed = tmp_path / 'campuran.pdf'
+    _write_pdf(mixed, [typed, None, None])
+
+    assert _pdf_has_text_layer(str(all_typed)) is True
+    assert _pdf_has_text_layer(str(mixed)) is False
+
+
+def test_text_layer_checks_from_many_threads_never_overlap(tmp_path, monkeypatch):
+    """pypdfium2 is not thread-safe: concurrent probes must open one document at a time."""
+    pypdfium2 = pytest.importorskip('pypdfium2')
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from app.services.docling_service import TEXT_LAYER_MIN_CHARS_PER_PAGE, _pdf_has_text_layer
+
+    typed = 'x' * (TEXT_LAYER_MIN_CHARS_PER_PAGE * 4)
+    digital = tmp_path / 'digital.pdf'
+    _write_pdf(digital, [typed, typed])
+    mixed = tmp_path / 'campuran.pdf'
+    _write_pdf(mixed, [typed, None])
+
+    open_documents = []
+    max_open = []
+    counter_lock = threading.Lock()
+    real_document = pypdfium2.PdfDocument
+
+    class TrackedDocument(real_document):
+        def __init__(self, *args, **kwargs):
+            with counter_lock:
+                open_documents.append(self)
+                max_open.append(len(open_documents))
+            super().__init__(*args, **kwargs)
+
+        def close(self):
+            with counter_lock:
+                if self in open_documents:
+                    open_documents.remove(self)
+            super().close()
+
+    monkeypatch.setattr(pypdfium2, 'PdfDocument', TrackedDocument)
+    paths = [str(digital), str(mixed)] * 16
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(_pdf_has_text_layer, paths))
+
+    assert results == [True, False] * 16
+    assert max(max_open) == 1
+    assert open_documents == []
+
+
+def test_parse_multiple_documents_preflights_each_file_before_the_batch(tmp_path, monkeypatch):
+    """Empty and fake PDFs in a multi-file submission never reach convert_all."""
+    from app.services import docling_service
+
+    good = tmp_path / 'jawaban.pdf'
+    good.write_bytes(b'%PDF-1.4\n')
+    empty = tmp_path / 'kosong.pdf'
+    empty.write_bytes(b'')
+    fake = tmp_path / 'palsu.pdf'
+    fake.write_bytes(b'bukan pdf')
+
+    ok_result = Mock(document=Mock(export_to_markdown=Mock(return_value='Isi jawaban')))
+    converter = Mock(convert_all=Mock(return_value=[ok_result]))
+    monkeypatch.setattr(docling_service, '_shared_converters', {(False, False): converter})
+
+    service = DoclingService(enable_ocr=False, use_gpu=False)
+    output = service.parse_multiple_documents([str(empty), str(good), str(fake)])
+
+    converter.convert_all.assert_called_once_with([str(good)], raises_on_error=False)
+    assert output == '--- Dokumen: jawaban.pdf ---\nIsi jawaban'
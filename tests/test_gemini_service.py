@@ -0,0 +1,102 @@
+"""Tests for the legacy Gemini service: key rotation, streaming and concurrent scoring."""
+
+import threading
+import time
+from types import SimpleNamespace
+
+from app.services.gemini_service import GeminiService, _truncate_words
+
+
+class FakeModels:
+    """Stands in for ``genai.Client().models``, streaming a canned response in chunks."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.calls = []
+
+    def generate_content_stream(self, model, contents, config):
+        self.calls.append(contents)
+        return iter(SimpleNamespace(text=text) for text in self.chunks)
+
+
+def test_truncate_words_at_below_and_above_limit():
+    """Text is cut only when it has more than ``max_words`` words."""
+    assert _truncate_words('satu dua', 3) == 'satu dua'
+    assert _truncate_words('satu dua tiga', 3) == 'satu dua tiga'
+    assert _truncate_words('satu dua tiga  ', 3) == 'satu dua tiga  '
+    assert _truncate_words('satu dua tiga empat', 3) == 'satu dua tiga...'
+
+
+def test_masked_keys_hide_short_keys_completely():
+    service = GeminiService(['AIzaSyABCDEFGHIJKLMN', 'short-key'])
+
+    assert service._masked_keys == ['AIzaSyAB...KLMN', '***']
+
+
+def test_get_next_key_rotates_round_robin():
+    service = GeminiService(['key-a-123456789', 'key-b-123456789', 'key-c-123456789'])
+
+    assert [service._get_next_key()[0] for _ in range(4)] == [0, 1, 2, 0]
+
+
+def test_get_next_key_skips_keys_in_cooldown():
+    service = GeminiService(['key-a-123456789', 'key-b-123456789', 'key-c-123456789'])
+    service._mark_rate_limited(1)
+
+    assert [service._get_next_key()[0] for _ in range(3)] == [0, 2, 0]
+
+    service._rl_until[1] = time.monotonic() - 1
+    assert [service._get_next_key()[0] for _ in range(2)] == [1, 2]
+
+
+def test_get_next_key_uses_earliest_cooldown_when_all_limited():
+    service = GeminiService(['key-a-123456789', 'key-b-123456789'])
+    now = time.monotonic()
+    service._rl_until = [now + 20, now + 5]
+
+    assert service._get_next_key()[0] == 1
+
+
+def test_score_report_joins_streamed_chunks(monkeypatch):
+    """Chunks are concatenated in order and empty chunks are skipped."""
+    models = FakeModels(['{"nim": "L200", "student_name": "Budi", ', None, '"score": 85, ', '"evaluation": "Baik"}'])
+    service = GeminiService(['key-a-123456789'])
+    monkeypatch.setattr(service, '_get_client', lambda api_key: SimpleNamespace(models=models))
+
+    result = service.score_report('Isi laporan')
+
+    assert result == {'nim': 'L200', 'student_name': 'Budi', 'score': 85, 'evaluation': 'Baik', 'error': False}
+    assert len(models.calls) == 1
+
+
+def test_score_many_preserves_input_order(monkeypatch):
+    """Results line up with the input even when later reports finish first."""
+    service = GeminiService(['key-a-123456789', 'key-b-123456789'])
+    seen_threads = set()
+
+    def fake_score_report(student_content, delay):
+        seen_threads.add(threading.current_thread().name)
+        time.sleep(delay)
+        return {'student_name': student_content}
+
+    monkeypatch.setattr(service, 'score_report', fake_score_report)
+    reports = [
+        {'student_content': 'A', 'delay': 0.05},
+        {'student_content': 'B', 'delay': 0.0},
+        {'student_content': 'C', 'delay': 0.02},
+    ]
+
+    results = service.score_many(reports)
+
+    assert [result['student_name'] for result in results] == ['A', 'B', 'C']
+    assert all(name.startswith('GeminiScore') for name in seen_threads)
+    assert service.score_many([]) == []
+
+
+def test_score_many_runs_inline_with_single_worker(monkeypatch):
+    service = GeminiService(['key-a-123456789'])
+    monkeypatch.setattr(service, 'score_report', lambda student_content: threading.current_thread().name)
+
+    assert service.score_many([{'student_content': 'A'}, {'student_content': 'B'}], max_concurrency=1) == [
+        threading.current_thread().name
+    ] * 2
@@ -0,0 +1,56 @@
+"""Unit tests for the LLM response caches."""
+
+import zlib
+
+import pytest
+
+from app.services.llm_cache import SEMANTIC_CHUNK_WORDS, SemanticLLMCache
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('faiss')
+
+
+class BagOfWordsModel:
+    """Stand-in for SentenceTransformer: hashed bag-of-words vectors, input truncated like MiniLM."""
+
+    max_words = 150
+
+    def encode(self, chunks, normalize_embeddings=True):
+        vectors = np.zeros((len(chunks), 256), dtype='float32')
+        for row, chunk in enumerate(chunks):
+            for word in chunk.split()[:self.max_words]:
+                vectors[row, zlib.crc32(word.encode()) % 256] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+
+def _semantic_cache(**kwargs):
+    cache = SemanticLLMCache(**kwargs)
+    cache._model = BagOfWordsModel()
+    return cache
+
+
+def test_semantic_cache_compares_answers_beyond_a_shared_template():
+    """Reports that only share the cover/template must not match each other."""
+    cache = _semantic_cache(threshold=0.92)
+    template = ' '.join(f'sampul{i}' for i in range(SEMANTIC_CHUNK_WORDS * 2))
+    first = template + ' ' + ' '.join(f'jawabanA{i}' for i in range(SEMANTIC_CHUNK_WORDS * 2))
+    second = template + ' ' + ' '.join(f'jawabanB{i}' for i in range(SEMANTIC_CHUNK_WORDS * 2))
+
+    cache.set('rubrik', cache.embed(first), {'score': 90})
+
+    assert cache.get('rubrik', cache.embed(second)) is None
+    assert cache.get('rubrik', cache.embed(first)) == {'score': 90}
+    assert cache.get('rubrik-lain', cache.embed(first)) is None
+
+
+def test_semantic_cache_bounds_partitions():
+    cache = _semantic_cache(max_partitions=2)
+    vector = cache.embed('laporan mahasiswa')
+
+    for key in ('a', 'b', 'c'):
+        cache.set(key, vector, {'score': 80})
+
+    assert len(cache._partitions) == 2
+    assert cache.get('a', vector) is None
+    assert cache.get('c', vector) == {'score': 80}
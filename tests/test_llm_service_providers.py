@@ -1,5 +1,6 @@
 """Tests for OpenAI-compatible provider support in LLMService."""
 
+import pytest
 from flask import current_app
 
 from app.models import LLMConfig
@@ -168,3 +169,308 @@ def test_filename_fallback_ignores_unlabeled_numeric_tokens(app, monkeypatch):
         )
 
         assert result['nim'] == 'TIDAK_DITEMUKAN'
+
+
+def test_identical_prompts_are_served_from_response_cache(app, monkeypatch):
+    """A repeated identical scoring request must not call the provider again."""
+    from app.services import llm_service
+    from app.services.llm_cache import LLMResponseCache
+
+    with app.app_context():
+        LLMConfig.set('llm_provider', 'gemini')
+        LLMConfig.set('gemini_api_keys', '["test-gemini-key"]')
+        monkeypatch.setattr(llm_service, '_response_cache', LLMResponseCache())
+
+        service = LLMService(current_app.config)
+        calls = []
+
+        def fake_score_with_gemini(*args, **kwargs):
+            calls.append(args)
+            return {'nim': 'L200111222', 'student_name': 'Nama', 'score': 88, 'evaluation': 'Baik', 'error': False}
+
+        monkeypatch.setattr(service, '_score_with_gemini', fake_score_with_gemini)
+
+        first = service.score_report(student_content='Laporan yang sama')
+        second = service.score_report(student_content='Laporan yang sama')
+        service.score_report(student_content='Laporan lain')
+
+        assert first == second
+        assert len(calls) == 2
+
+
+def test_extract_fallback_skips_braces_inside_strings_and_preambles():
+    text = (
+        'Contoh format: {"a": 1}. Hasil: '
+        '{"nim": "L200", "student_name": "Budi", "score": 77, '
+        '"evaluation": "Kurung } dan { di dalam teks", "detail": {"x": 1}}'
+    )
+
+    result = LLMService._extract_fallback(text, 50, 100)
+
+    assert result['score'] == 77
+    assert result['nim'] == 'L200'
+    assert result['student_name'] == 'Budi'
+
+
+def test_semantic_cache_hit_reuses_score_but_not_identity(app, monkeypatch):
+    """A near-duplicate hit keeps the score while identity comes from the new file."""
+    from app.services import llm_service
+
+    class FakeSemanticCache:
+        def embed(self, text):
+            return text
+
+        def get(self, context_key, vector):
+            return {'nim': 'L200999999', 'student_name': 'Orang Lain', 'score': 90, 'evaluation': 'Baik', 'error': False}
+
+        def set(self, context_key, vector, result):
+            raise AssertionError('hit must not be stored again')
+
+    with app.app_context():
+        LLMConfig.set('llm_provider', 'gemini')
+        LLMConfig.set('gemini_api_keys', '["test-gemini-key"]')
+        current_app.config['SEMANTIC_CACHE_ENABLED'] = True
+        monkeypatch.setattr(llm_service, '_response_cache', None)
+        monkeypatch.setattr(llm_service, '_semantic_cache', FakeSemanticCache())
+        monkeypatch.setattr(llm_service, '_semantic_cache_loaded', True)
+
+        service = LLMService(current_app.config)
+        monkeypatch.setattr(service, '_score_with_gemini', lambda *a, **k: pytest.fail('provider called'))
+
+        result = service.score_report(
+            student_content='Laporan hampir sama',
+            source_filename='L200123456_Budi Santoso.pdf',
+        )
+
+        assert result['score'] == 90
+        assert result['nim'] == 'L200123456'
+        assert result['student_name'] == 'Budi Santoso'
+
+
+def test_active_config_is_cached_until_invalidated(app):
+    with app.app_context():
+        LLMConfig.set('llm_provider', 'deepseek')
+        service = LLMService(current_app.config)
+        assert service._get_active_config()['provider'] == 'deepseek'
+
+        LLMConfig.set('llm_provider', 'openrouter')
+        assert service._get_active_config()['provider'] == 'deepseek'
+
+        LLMService.invalidate_config_cache()
+        assert service._get_active_config()['provider'] == 'openrouter'
+
+
+def test_retry_delay_prefers_provider_hint_and_is_capped():
+    from app.services.llm_service import MAX_RETRY_DELAY_SEC, _retry_delay
+
+    class FakeResponse:
+        headers = {'retry-after': '2'}
+
+    class RateLimited(Exception):
+        response = FakeResponse()
+
+    assert _retry_delay(RateLimited('429'), attempt=2) == 2.0
+    assert _retry_delay(Exception('Please retry in 4.5s.'), attempt=0) == 4.5
+    assert _retry_delay(Exception('retry in 600s'), attempt=0) == MAX_RETRY_DELAY_SEC
+    assert _retry_delay(Exception('boom'), attempt=1) == 2
+
+
+def test_stream_fallback_only_on_unsupported_streaming_errors():
+    from app.services.llm_service import _is_stream_unsupported
+
+    assert _is_stream_unsupported(Exception("Unsupported value: 'stream' does not support true with this model."))
+    assert _is_stream_unsupported(Exception('Streaming is not supported for this model'))
+    assert _is_stream_unsupported(Exception('Invalid parameter: stream_options'))
+    assert not _is_stream_unsupported(Exception('upstream connect error or disconnect/reset before headers'))
+    assert not _is_stream_unsupported(Exception('Upstream returned an invalid response'))
+    assert not _is_stream_unsupported(Exception('Stream closed by peer'))
+
+
+def test_collect_stream_stops_once_json_result_is_complete():
+    class FakeStream:
+        closed = False
+
+        def __iter__(self):
+            yield from ['{"nim": "L200", ', '"score": 80}', ' Penjelasan tambahan', ' yang panjang']
+            pytest.fail('stream read past the JSON object')
+
+        def close(self):
+            self.closed = True
+
+    stream = FakeStream()
+
+    text = LLMService._collect_stream(stream, lambda chunk: chunk)
+
+    assert text == '{"nim": "L200", "score": 80}'
+    assert stream.closed
+
+
+def test_rate_limited_gemini_key_is_skipped_until_cooldown_expires(app, monkeypatch):
+    from app.services import llm_service
+
+    with app.app_context():
+        service = LLMService(current_app.config)
+        keys = ['gemini-key-aaaaaaaa', 'gemini-key-bbbbbbbb']
+        clock = [1000.0]
+        monkeypatch.setattr(llm_service.time, 'monotonic', lambda: clock[0])
+
+        first_idx, _, _ = service._get_next_gemini_key(keys)
+        service._rate_limited_until[first_idx] = clock[0] + 60
+
+        picks = {service._get_next_gemini_key(keys)[0] for _ in range(4)}
+        assert picks == {1 - first_idx}
+
+        clock[0] += 61
+        picks = {service._get_next_gemini_key(keys)[0] for _ in range(4)}
+        assert picks == {0, 1}
+
+
+def test_score_reports_batch_maps_batch_output_back_to_inputs(app, monkeypatch):
+    import json
+    from types import SimpleNamespace
+
+    class FakeClient:
+        def __init__(self):
+            self.uploaded = None
+            self.files = SimpleNamespace(create=self.create_file, content=self.file_content)
+            self.batches = SimpleNamespace(create=self.create_batch, retrieve=self.retrieve_batch)
+
+        def create_file(self, file, purpose):
+            self.uploaded = [json.loads(line) for line in file[1].splitlines()]
+            return SimpleNamespace(id='file-in')
+
+        def create_batch(self, **kwargs):
+            return SimpleNamespace(id='batch-1', status='in_progress', output_file_id=None)
+
+        def retrieve_batch(self, batch_id):
+            return SimpleNamespace(id=batch_id, status='completed', output_file_id='file-out')
+
+        def file_content(self, file_id):
+            lines = []
+            for request, score in zip(reversed(self.uploaded), (70, 90)):
+                content = json.dumps({'nim': 'TIDAK_DITEMUKAN', 'student_name': 'X', 'score': score, 'evaluation': 'ok'})
+                lines.append(json.dumps({
+                    'custom_id': request['custom_id'],
+                    'response': {'body': {'choices': [{'message': {'content': content}}]}},
+                }))
+            return SimpleNamespace(text='\n'.join(lines))
+
+    with app.app_context():
+        LLMConfig.set('llm_provider', 'openai')
+        LLMConfig.set('openai_api_key', 'sk-test')
+        service = LLMService(current_app.config)
+        client = FakeClient()
+        monkeypatch.setattr(service, '_get_openai_client', lambda api_key, base_url: client)
+
+        results = service.score_reports_batch(
+            [
+                {'student_content': 'Laporan A', 'source_filename': 'L200000001_Ani.pdf'},
+                {'student_content': 'Laporan B'},
+            ],
+            poll_interval=0,
+        )
+
+        assert [r['score'] for r in results] == [90, 70]
+        assert results[0]['nim'] == 'L200000001'
+        assert client.uploaded[0]['url'] == '/v1/chat/completions'
+
+
+def test_user_prompt_keeps_shared_references_as_identical_prefix():
+    first = LLMService._build_user_prompt('Laporan A', 'Kunci\r\n', 'Soal  ', 'L200000001_Ani.pdf')
+    second = LLMService._build_user_prompt('Laporan B', 'Kunci\n', 'Soal', 'L200000002_Budi.pdf')
+
+    shared = first[:first.index('=== METADATA FILE LAPORAN')]
+    assert second.startswith(shared)
+    assert 'Kunci\n=== AKHIR KUNCI JAWABAN' in shared
+
+
+def test_score_reports_runs_in_threads_and_keeps_input_order(app, monkeypatch):
+    import threading
+
+    with app.app_context():
+        LLMConfig.set('llm_provider', 'gemini')
+        LLMConfig.set('gemini_api_keys', '["test-gemini-key"]')
+        current_app.config['LLM_CACHE_ENABLED'] = False
+        service = LLMService(current_app.config)
+        threads = set()
+
+        def fake_score_with_gemini(cfg, system_prompt, user_prompt, *args):
+            threads.add(threading.get_ident())
+            score = int(user_prompt.split('Nilai ')[1].split('\n')[0])
+            return {'nim': 'L200', 'student_name': 'Nama', 'score': score, 'evaluation': '', 'error': False}
+
+        monkeypatch.setattr(service, '_score_with_gemini', fake_score_with_gemini)
+
+        results = service.score_reports(
+            [{'student_content': f'Nilai {score}'} for score in (60, 70, 80, 90)], max_workers=4
+        )
+
+        assert [r['score'] for r in results] == [60, 70, 80, 90]
+        assert threading.get_ident() not in threads
+
+
+def test_json_mode_rejection_is_remembered_per_model(app, monkeypatch):
+    from types import SimpleNamespace
+
+    calls = []
+
+    def create(**kwargs):
+        calls.append('response_format' in kwargs)
+        if 'response_format' in kwargs:
+            raise ValueError('response_format json_object is not supported by this model')
+        message = SimpleNamespace(content='{"nim": "L200", "student_name": "A", "score": 80, "evaluation": "ok"}')
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+    with app.app_context():
+        LLMConfig.set('llm_provider', 'siliconflow')
+        LLMConfig.set('llm_model', 'no-json-mode-model')
+        LLMConfig.set('siliconflow_api_key', 'sk-test')
+        current_app.config['LLM_CACHE_ENABLED'] = False
+        monkeypatch.setattr(LLMService, '_json_mode_supported', {})
+        service = LLMService(current_app.config)
+        monkeypatch.setattr(service, '_get_openai_client', lambda api_key, base_url: client)
+
+        assert service.score_report(student_content='Laporan A')['score'] == 80
+        assert service.score_report(student_content='Laporan B')['score'] == 80
+        assert calls == [True, False, False]
+
+
+def test_semantic_cache_miss_embeds_the_report_once(app, monkeypatch):
+    from app.services import llm_service
+
+    class RecordingSemanticCache:
+        def __init__(self):
+            self.embedded = []
+            self.stored = []
+
+        def embed(self, text):
+            self.embedded.append(text)
+            return ('vektor', text)
+
+        def get(self, context_key, vector):
+            return None
+
+        def set(self, context_key, vector, result):
+            self.stored.append(vector)
+
+    semantic_cache = RecordingSemanticCache()
+
+    with app.app_context():
+        LLMConfig.set('llm_provider', 'gemini')
+        LLMConfig.set('gemini_api_keys', '["test-gemini-key"]')
+        current_app.config['SEMANTIC_CACHE_ENABLED'] = True
+        current_app.config['LLM_CACHE_ENABLED'] = False
+        monkeypatch.setattr(llm_service, '_semantic_cache', semantic_cache)
+        monkeypatch.setattr(llm_service, '_semantic_cache_loaded', True)
+
+        service = LLMService(current_app.config)
+        monkeypatch.setattr(service, '_score_with_gemini', lambda *a, **k: {
+            'nim': 'L200', 'student_name': 'Ani', 'score': 75, 'evaluation': 'ok', 'error': False,
+        })
+
+        service.score_report(student_content='Laporan baru')
+
+        assert semantic_cache.embedded == ['Laporan baru']
+        assert semantic_cache.stored == [('vektor', 'Laporan baru')]
@@ -197,3 +197,24 @@ class TestSystemLogModel:
             assert log.level == 'INFO'
             assert log.category == 'test'
             assert log.message == 'Test log message'
+    
+    def test_log_is_batched_through_writer(self, app, monkeypatch):
+        """With a writer attached, log entries are queued and inserted together on flush."""
+        from app.services.log_writer_service import SystemLogWriter
+        
+        writer = SystemLogWriter(app)
+        monkeypatch.setattr(SystemLog, '_writer', writer)
+        
+        with app.app_context():
+            assert SystemLog.log('INFO', 'batch', 'pertama') is None
+            assert SystemLog.log('WARNING', 'batch', 'kedua', details='{"n": 2}') is None
+            assert SystemLog.query.filter_by(category='batch').count() == 0
+            
+            writer.flush()
+            
+            logs = SystemLog.query.filter_by(category='batch').order_by(SystemLog.id).all()
+            assert [log.message for log in logs] == ['pertama', 'kedua']
+            assert logs[0].timestamp is not None
+            
+            immediate = SystemLog.log('ERROR', 'batch', 'langsung', flush=True)
+            assert immediate.id is not None
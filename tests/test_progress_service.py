@@ -0,0 +1,218 @@
+"""
+Unit tests for the job progress store.
+"""
+
+from app.services.progress_service import ProgressStore
+
+
+class TestProgressStore:
+    """Test bounded progress storage."""
+
+    def test_basic_mapping_operations(self):
+        store = ProgressStore()
+        store[1] = {'status': 'pending'}
+
+        assert 1 in store
+        assert store[1]['status'] == 'pending'
+        assert store.get(2) is None
+        assert store.pop(1)['status'] == 'pending'
+        assert 1 not in store
+
+    def test_store_is_bounded(self):
+        store = ProgressStore(maxsize=2)
+        for job_id in range(5):
+            store[job_id] = {'status': 'pending'}
+
+        assert len(store) == 2
+        assert 4 in store
+        assert 0 not in store
+
+    def test_entries_expire(self):
+        store = ProgressStore(ttl=0.01)
+        store[1] = {'status': 'pending'}
+
+        import time
+        time.sleep(0.02)
+
+        assert store.get(1) is None
+
+    def test_wait_for_update_wakes_on_write(self):
+        import threading
+
+        store = ProgressStore()
+        store[1] = {'status': 'processing'}
+        version, progress = store.wait_for_update(1, since=0, timeout=0)
+        assert progress['status'] == 'processing'
+
+        timer = threading.Timer(0.05, store.__setitem__, args=(1, {'status': 'completed'}))
+        timer.start()
+        new_version, progress = store.wait_for_update(1, since=version, timeout=5)
+        timer.join()
+
+        assert new_version > version
+        assert progress['status'] == 'completed'
+
+    def test_wait_for_update_times_out_without_changes(self):
+        store = ProgressStore()
+        store[1] = {'status': 'processing'}
+        version, _ = store.wait_for_update(1)
+
+        assert store.wait_for_update(1, since=version, timeout=0.01) == (version, {'status': 'processing'})
+        assert store.wait_for_update(2, timeout=0.01) == (0, None)
+
+
+class TestCreateProgressStore:
+    """Test progress backend selection."""
+
+    def test_defaults_to_in_memory_store(self):
+        from app.services.progress_service import create_progress_store
+
+        assert isinstance(create_progress_store(None), ProgressStore)
+
+    def test_falls_back_to_memory_without_redis_package(self, monkeypatch):
+        from app.services import progress_service
+
+        monkeypatch.setattr(progress_service, 'redis', None)
+        store = progress_service.create_progress_store('redis://localhost:6379/0')
+
+        assert isinstance(store, ProgressStore)
+
+
+class FakeRedis:
+    """In-process stand-in for redis.Redis covering the calls RedisProgressStore makes."""
+
+    def __init__(self):
+        self.values = {}
+        self.counters = {}
+        self.channels = {}
+        self.down = False
+
+    def _check(self):
+        if self.down:
+            raise ConnectionError('redis down')
+
+    def get(self, key):
+        self._check()
+        return self.values.get(key)
+
+    def incr(self, key):
+        self._check()
+        self.counters[key] = self.counters.get(key, 0) + 1
+        return self.counters[key]
+
+    def delete(self, key):
+        self._check()
+        self.values.pop(key, None)
+
+    def scan_iter(self, match):
+        self._check()
+        prefix = match.rstrip('*')
+        return [key for key in self.values if key.startswith(prefix)]
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    def pubsub(self, ignore_subscribe_messages=True):
+        self._check()
+        return FakePubSub(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self._client = client
+        self._ops = []
+
+    def set(self, key, value, ex=None):
+        self._ops.append(lambda: self._client.values.__setitem__(key, value))
+
+    def publish(self, channel, message):
+        def publish():
+            for queue in self._client.channels.get(channel, []):
+                queue.put({'type': 'message', 'data': message})
+        self._ops.append(publish)
+
+    def execute(self):
+        self._client._check()
+        for op in self._ops:
+            op()
+
+
+class FakePubSub:
+    def __init__(self, client):
+        import queue
+
+        self._client = client
+        self._queue = queue.Queue()
+
+    def subscribe(self, channel):
+        self._client.channels.setdefault(channel, []).append(self._queue)
+
+    def get_message(self, timeout):
+        import queue
+
+        self._client._check()
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        for queues in self._client.channels.values():
+            if self._queue in queues:
+                queues.remove(self._queue)
+
+
+class TestRedisProgressStore:
+    """Test the Redis-backed store against a fake client."""
+
+    def test_set_get_and_pop(self):
+        from app.services.progress_service import RedisProgressStore
+
+        store = RedisProgressStore(FakeRedis())
+        store[1] = {'status': 'processing'}
+
+        assert 1 in store
+        assert len(store) == 1
+        assert store[1] == {'status': 'processing'}
+        assert store.get(2) is None
+        assert store.pop(1) == {'status': 'processing'}
+        assert 1 not in store
+
+    def test_wait_for_update_wakes_on_write(self):
+        import threading
+
+        from app.services.progress_service import RedisProgressStore
+
+        store = RedisProgressStore(FakeRedis())
+        store[1] = {'status': 'processing'}
+        version, _ = store.wait_for_update(1, timeout=0)
+
+        timer = threading.Timer(0.05, store.__setitem__, args=(1, {'status': 'completed'}))
+        timer.start()
+        new_version, progress = store.wait_for_update(1, since=version, timeout=5)
+        timer.join()
+
+        assert new_version > version
+        assert progress == {'status': 'completed'}
+        assert store.wait_for_update(1, since=new_version, timeout=0.01) == (new_version, progress)
+
+    def test_redis_errors_degrade_to_missing_entries(self):
+        import time
+
+        from app.services.progress_service import RedisProgressStore
+
+        client = FakeRedis()
+        store = RedisProgressStore(client)
+        store[1] = {'status': 'processing'}
+        client.down = True
+
+        store[1] = {'status': 'completed'}
+        assert store.get(1) is None
+        assert 1 not in store
+        assert len(store) == 0
+        assert store.pop(1, {'status': 'unknown'}) == {'status': 'unknown'}
+
+        started = time.monotonic()
+        assert store.wait_for_update(1, timeout=0) == (0, None)
+        assert store.wait_for_update(1, since=0, timeout=0.05) == (0, None)
+        assert time.monotonic() - started >= 0.05
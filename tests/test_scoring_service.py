@@ -376,3 +376,131 @@ class TestOcrStatusHeuristic:
 
             assert status == 'OCR Berhasil'
             assert 'memadai' in detail.lower()
+
+
+class TestRunScoring:
+    """Test the end-to-end scoring loop with mocked parsing/LLM."""
+
+    def test_identical_submissions_are_scored_once(self, app):
+        """Files with the same content hash should share one scoring result."""
+        with app.app_context():
+            from app.extensions import db
+            from app.models import User, Job, JobResult
+            from app.services.scoring_service import ScoringService
+
+            user = User.query.filter_by(username='testuser').first()
+            job = Job(user_id=user.id, total_files=3, status='pending', additional_notes='catatan')
+            db.session.add(job)
+            db.session.commit()
+
+            saved_files = [
+                {'original_name': 'a.pdf', 'path': '/tmp/a.pdf', 'content_hash': 'h1'},
+                {'original_name': 'b.pdf', 'path': '/tmp/b.pdf', 'content_hash': 'h1'},
+                {'original_name': 'c.pdf', 'path': '/tmp/c.pdf', 'content_hash': 'h2'},
+            ]
+            for file_info in saved_files:
+                db.session.add(JobResult(job_id=job.id, filename=file_info['original_name'],
+                                         content_hash=file_info['content_hash'], status='pending'))
+            db.session.commit()
+            job_id = job.id
+
+        service = ScoringService(app)
+        service._process_single_file = Mock(return_value={
+            'nim': 'L200200001',
+            'student_name': 'John Doe',
+            'score': 80,
+            'evaluation': 'ok',
+            'error': False,
+        })
+        progress_store = {}
+
+        service._run_scoring(job_id, '/tmp', saved_files, progress_store)
+
+        assert service._process_single_file.call_count == 2
+        assert progress_store[job_id]['status'] == 'completed'
+
+        with app.app_context():
+            from app.extensions import db
+            from app.models import Job, JobResult
+
+            job = db.session.get(Job, job_id)
+            assert job.status == 'completed'
+            assert job.processed_files == 3
+            rows = JobResult.query.filter_by(job_id=job_id).all()
+            assert {row.filename: row.score for row in rows} == {'a.pdf': 80, 'b.pdf': 80, 'c.pdf': 80}
+            os.unlink(job.result_csv_path)
+
+    def test_flush_job_results_writes_each_row_in_one_batch(self, app):
+        """Buffered results are written per filename and the buffer is cleared."""
+        with app.app_context():
+            from app.extensions import db
+            from app.models import User, Job, JobResult
+            from app.services.scoring_service import ScoringService
+
+            user = User.query.filter_by(username='testuser').first()
+            job = Job(user_id=user.id, total_files=2, status='processing')
+            db.session.add(job)
+            db.session.commit()
+            for name in ('ok.pdf', 'bad.pdf'):
+                db.session.add(JobResult(job_id=job.id, filename=name, status='pending'))
+            db.session.commit()
+
+            pending = [
+                ('ok.pdf', {'nim': 'L200', 'student_name': 'Ani', 'score': 90, 'evaluation': 'Baik', 'error': False}),
+                ('bad.pdf', {'nim': 'ERROR', 'student_name': 'ERROR', 'score': None,
+                             'evaluation': 'Gagal membaca file', 'error': True}),
+            ]
+            ScoringService(app)._flush_job_results(job, pending, 2)
+
+            assert pending == []
+            assert db.session.get(Job, job.id).processed_files == 2
+            rows = {row.filename: row for row in JobResult.query.filter_by(job_id=job.id)}
+            assert (rows['ok.pdf'].score, rows['ok.pdf'].status, rows['ok.pdf'].error_message) == (90, 'completed', None)
+            assert rows['bad.pdf'].status == 'error'
+            assert rows['bad.pdf'].error_message == 'Gagal membaca file'
+            assert rows['bad.pdf'].processed_at is not None
+
+    def test_flush_job_results_falls_back_to_rows_and_keeps_failures(self, app, monkeypatch):
+        """A failed batch is written row by row; rows that still fail stay buffered for the next flush."""
+        with app.app_context():
+            from app.extensions import db
+            from app.models import User, Job, JobResult
+            from app.services import scoring_service
+            from app.services.scoring_service import ScoringService
+
+            user = User.query.filter_by(username='testuser').first()
+            job = Job(user_id=user.id, total_files=2, status='processing')
+            db.session.add(job)
+            db.session.commit()
+            for name in ('a.pdf', 'b.pdf'):
+                db.session.add(JobResult(job_id=job.id, filename=name, status='pending'))
+            db.session.commit()
+
+            def result(score):
+                return {'nim': 'L200', 'student_name': 'Ani', 'score': score, 'evaluation': 'ok', 'error': False}
+
+            service = ScoringService(app)
+            monkeypatch.setattr(scoring_service, 'case', Mock(side_effect=RuntimeError('batch gagal')))
+            real_execute = db.session.execute
+
+            def execute(statement, *args, **kwargs):
+                if 'b.pdf' in str(statement.compile(compile_kwargs={'literal_binds': True})):
+                    raise RuntimeError('baris gagal')
+                return real_execute(statement, *args, **kwargs)
+
+            monkeypatch.setattr(db.session, 'execute', execute)
+            pending = [('a.pdf', result(70)), ('b.pdf', result(80))]
+            service._flush_job_results(job, pending, 2)
+
+            assert [name for name, _ in pending] == ['b.pdf']
+            rows = {row.filename: row for row in JobResult.query.filter_by(job_id=job.id)}
+            assert (rows['a.pdf'].score, rows['a.pdf'].status) == (70, 'completed')
+            assert rows['b.pdf'].status == 'pending'
+            assert db.session.get(Job, job.id).processed_files == 2
+
+            monkeypatch.setattr(db.session, 'execute', real_execute)
+            service._flush_job_results(job, pending, 2)
+
+            assert pending == []
+            db.session.expire_all()
+            assert JobResult.query.filter_by(job_id=job.id, filename='b.pdf').one().score == 80
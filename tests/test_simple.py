@@ -54,6 +54,20 @@ class TestAppCreation:
         assert test_app is not None
         assert test_app.config['TESTING'] is True
 
+    def test_spawned_workers_do_not_create_app(self, monkeypatch):
+        """Spawned Docling workers re-import run.py as __mp_main__ without building an app."""
+        import runpy
+        import app as app_package
+
+        calls = []
+        monkeypatch.setattr(app_package, 'create_app', lambda: calls.append(1))
+        run_py = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'run.py')
+
+        namespace = runpy.run_path(run_py, run_name='__mp_main__')
+
+        assert calls == []
+        assert 'app' not in namespace
+
 
 class TestDatabase:
     """Test database operations."""
@@ -26,7 +26,7 @@ class TestSingleProcessingIntegration:
                 content_type='multipart/form-data'
             )
 
-        assert response.status_code == 200
+        assert response.status_code == 202
         data = json.loads(response.data)
         assert data['success'] is True
 
@@ -56,7 +56,7 @@ class TestSingleProcessingIntegration:
                 content_type='multipart/form-data'
             )
 
-        assert response.status_code == 200
+        assert response.status_code == 202
         data = json.loads(response.data)
         assert data['success'] is True
         assert 'job_id' in data
@@ -82,7 +82,7 @@ class TestSingleProcessingIntegration:
                 content_type='multipart/form-data'
             )
 
-        assert response.status_code == 200
+        assert response.status_code == 202
         data = json.loads(response.data)
         assert data['success'] is True
         assert 'job_id' in data
@@ -92,6 +92,7 @@ class TestSingleProcessingIntegration:
             from app.extensions import db
             job = db.session.get(Job, data['job_id'])
             assert job.total_files == 2
+            assert job.results.count() == 2
 
 
 class TestSingleProcessingJobResults: